@@ -14,55 +14,68 @@ class DepthFirstSearch(object):
     def __init__(self, graph, undirected=False):
         self._graph = graph
         self._undirected = undirected
-
-        self._enter = dict()
-        self._leave = dict()
+        compact = graph.compact()
+        self._index = compact.index
+
+        n = len(compact.nodes)
+        sources = compact.lists["sources"]
+        targets = compact.lists["targets"]
+        forward = compact.lists["forward"]
+        offsets = compact.lists["offsets"]
+        backward = compact.lists["backward"]
+        roffsets = compact.lists["roffsets"]
+        self._enter = [None] * n
+        self._leave = [None] * n
         self.n_runs = 0
 
-        def compute_timestamps(node, timestamp):
-            self._enter[node] = next(timestamp)
-            for edge in self._graph.find_node(node).outgoing_edges:
-                if not edge.tgt in self._enter:
-                    compute_timestamps(edge.tgt, timestamp)
+        def compute_timestamps(i, timestamp):
+            self._enter[i] = next(timestamp)
+            for e in forward[offsets[i]:offsets[i + 1]]:
+                if self._enter[targets[e]] is None:
+                    compute_timestamps(targets[e], timestamp)
             if self._undirected:
-                for edge in self._graph.find_node(node).incoming_edges:
-                    if not edge.src in self._enter:
-                        compute_timestamps(edge.src, timestamp)
-            self._leave[node] = next(timestamp)
+                for e in backward[roffsets[i]:roffsets[i + 1]]:
+                    if self._enter[sources[e]] is None:
+                        compute_timestamps(sources[e], timestamp)
+            self._leave[i] = next(timestamp)
         timestamp = itertools.count()
-        for node in self._graph.nodes:
-            if not node.id in self._enter:
-                compute_timestamps(node.id, timestamp)
+        for i in range(n):
+            if self._enter[i] is None:
+                compute_timestamps(i, timestamp)
                 self.n_runs += 1
 
     def is_back_edge(self, edge):
+        src, tgt = self._index[edge.src], self._index[edge.tgt]
         return \
-            self._enter[edge.tgt] < self._enter[edge.src] and \
-            self._leave[edge.src] < self._leave[edge.tgt]
+            self._enter[tgt] < self._enter[src] and \
+            self._leave[src] < self._leave[tgt]
 
 
 class InspectedGraph(object):
 
     def __init__(self, graph):
         self.graph = graph
+        self.compact = graph.compact()
         self.n_nodes = len(graph.nodes)
         self.dfs = DepthFirstSearch(graph)
         self.undirected_dfs = DepthFirstSearch(graph, undirected=True)
 
     def n_root_nodes(self):
-        return sum(1 for node in self.graph.nodes if node.is_root())
+        return int((self.compact.indegrees() == 0).sum())
 
     def n_leaf_nodes(self):
-        return sum(1 for node in self.graph.nodes if node.is_leaf())
+        return int((self.compact.outdegrees() == 0).sum())
 
     def n_top_nodes(self):
-        return sum(1 for node in self.graph.nodes if node.is_top())
+        return sum(1 for node in self.graph.nodes if node.is_top)
 
     def n_singleton_nodes(self):
         return sum(1 for node in self.graph.nodes if node.is_singleton())
 
     def n_loops(self):
-        return sum(1 for edge in self.graph.edges if edge.is_loop())
+        compact = self.compact
+        return int(((compact.sources == compact.targets)
+                    & (compact.sources >= 0)).sum())
 
     def n_components(self):
         return self.undirected_dfs.n_runs - self.n_singleton_nodes()
@@ -77,10 +90,7 @@ class InspectedGraph(object):
         if self.is_cyclic():
             return False
         else:
-            for node in self.graph.nodes:
-                if len(node.incoming_edges) > 1:
-                    return False
-            return True
+            return not (self.compact.indegrees() > 1).any()
 
     def is_tree(self):
         return self.is_forest() and self.n_components() == 1
@@ -153,10 +163,7 @@ class InspectedGraph(object):
         if n_nodes <= 1:
             return 1
         else:
-            n_edges = 0
-            for edge in self.graph.edges:
-                if edge.src != edge.tgt:
-                    n_edges += 1
+            n_edges = len(self.graph.edges) - self.n_loops()
             return n_edges / (n_nodes - 1)
 
 
@@ -0,0 +1,106 @@
+import re;
+from bisect import bisect_left;
+
+#
+# anchoring of (token) strings against the underlying input, allowing for the
+# range of conventions in rendering punctuation marks, e.g. ‘“’ vs. ‘``’ or
+# ‘"’, and ‘—’ vs. ‘---’ or ‘--’.  rather than trying one substitution after
+# the other for each token, the input string is folded once (where needed),
+# mapping all variants of a punctuation mark to one (private use) character,
+# with an offset map back into the original string; forms, folded likewise,
+# are then located in the folded input by a single forward search.
+#
+CLASSES = {"‘": "\ue000", "’": "\ue000", "`": "\ue000", "'": "\ue000",
+           "“": "\ue001", "”": "\ue001", "\"": "\ue001",
+           "–": "\ue002", "—": "\ue002", "---": "\ue002", "--": "\ue002",
+           "…": "\ue003", "...": "\ue003", ". . .": "\ue003"};
+VARIANTS = re.compile("|".join(re.escape(variant) for variant
+                               in sorted(CLASSES, key = len, reverse = True)));
+
+#
+# as a last resort, when anchoring at the current position, any punctuation
+# mark is accepted (irrespective of the form), with longer variants first.
+#
+PUNCTUATION = (("“", "``", "\""), ("‘", "`"), ("”", "''", "\""), ("’", "'"),
+               ("—", "---", "--"), ("…", ". . .", "..."));
+
+def fold(string):
+  return VARIANTS.sub(lambda match: CLASSES[match.group()], string);
+
+class Anchorer(object):
+
+  def __init__(self, input, id = None):
+    self.input = input;
+    self.id = id;
+    self.i = 0;
+    self.folded = None;
+    self.starts = None;
+
+  def _fold_(self):
+    #
+    # .starts. maps each character of the folded input to its offset into the
+    # original string (plus one final entry, for the end of the string)
+    #
+    folded, starts = [], [];
+    i = 0;
+    for match in VARIANTS.finditer(self.input):
+      start, end = match.span();
+      folded.append(self.input[i:start]);
+      starts.extend(range(i, start));
+      folded.append(CLASSES[match.group()]);
+      starts.append(start);
+      i = end;
+    folded.append(self.input[i:]);
+    starts.extend(range(i, len(self.input) + 1));
+    self.folded = "".join(folded);
+    self.starts = starts;
+
+  def _fail_(self, form):
+    raise Exception("{}failed to anchor |{}| in |{}|{}| ({})"
+                    "".format("{}: ".format(self.id) if self.id else "",
+                              form, self.input[:self.i],
+                              self.input[self.i:], self.i));
+
+  def _advance_(self, start, end):
+    self.i = end;
+    return {"from": start, "to": end};
+
+  def find(self, form):
+    #
+    # locate .form. at or after the current position, preferring an exact
+    # match, or else the first match modulo punctuation variants.
+    #
+    i = self.i;
+    if form:
+      j = self.input.find(form, i);
+      if j >= i: return self._advance_(j, j + len(form));
+      if self.folded is None: self._fold_();
+      key = fold(form);
+      j = self.folded.find(key, bisect_left(self.starts, i));
+      if j >= 0: return self._advance_(self.starts[j], self.starts[j + len(key)]);
+    self._fail_(form);
+
+  def skip(self):
+    n = len(self.input);
+    while self.i < n and self.input[self.i] in {" ", "\t"}:
+      self.i += 1;
+
+  def match(self, form):
+    #
+    # anchor .form. at the current position, after skipping whitespace
+    #
+    self.skip();
+    i = self.i;
+    if form and self.input.startswith(form, i):
+      return self._advance_(i, i + len(form));
+    if self.folded is None: self._fold_();
+    k = bisect_left(self.starts, i);
+    key = fold(form);
+    if key and k < len(self.starts) and self.starts[k] == i \
+       and self.folded.startswith(key, k):
+      return self._advance_(i, self.starts[k + len(key)]);
+    for candidates in PUNCTUATION:
+      for candidate in candidates:
+        if self.input.startswith(candidate, i):
+          return self._advance_(i, i + len(candidate));
+    self._fail_(form);
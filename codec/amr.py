@@ -2,11 +2,14 @@ import re;
 import sys;
 
 import codec.mrp;
+from anchoring import Anchorer;
 from graph import Edge, Graph;
 from smatch.amr import AMR;
 
 STASH = re.compile(r'__[0-9]+__');
 INDEX = re.compile(r'x([0-9]+)((:?_[0-9]+)*)');
+ROLE = re.compile(r'((?:^|[ \t]):[^( ]+)\([^ \t]*\)([ \t]|$)');
+CONSTANT = re.compile(r'(^|[ \t])(x[0-9]+/[^ \t]+)([ \t]|$)');
 
 def amr_lines(fp, camr, alignment):
     id, snt, lines = None, None, [];
@@ -48,10 +51,8 @@ def amr_lines(fp, camr, alignment):
                    snt = line[8:].strip();
             else:
                 if camr:
-                    line = re.sub(r'((?:^|[ \t]):[^( ]+)\([^ \t]*\)([ \t]|$)',
-                                  "\\1\\2", line, count = 0);
-                    line = re.sub(r'(^|[ \t])(x[0-9]+/[^ \t]+)([ \t]|$)',
-                                  _stash_, line, count = 0);
+                    line = ROLE.sub("\\1\\2", line);
+                    line = CONSTANT.sub(_stash_, line);
                 lines.append(line)
     if len(lines) > 0:
         i = mapping = None;
@@ -104,38 +105,12 @@ def amr2graph(id, amr, text, stash, camr = False,
     node2id = dict();
     anchoring = list();
 
-    i = 0;
-    def _anchor_(form):
-        nonlocal i;
-        m = None;
-        j = graph.input.find(form, i);
-        if j >= i:
-            i, m = j, len(form);
-        else:
-            base = form;
-            k, l = len(graph.input), 0;
-            for old, new in {("‘", "`"), ("‘", "'"), ("’", "'"), ("`", "'"),
-                             ("“", "\""), ("”", "\""),
-                             ("–", "--"), ("–", "---"), ("—", "---"),
-                             ("…", "..."), ("…", ". . .")}:
-                form = base.replace(old, new);
-                j = graph.input.find(form, i);
-                if j >= i and j < k: k, l = j, len(form);
-            if k < len(graph.input): i, m = k, l;
-        if m:
-            match = {"from": i, "to": i + m}; 
-            i += m;
-            return match;
-        else:
-            raise Exception("failed to anchor |{}| in |{}|{}| ({})"
-                            "".format(form, graph.input[:i],
-                                      graph.input[i:], i));
-
     if text:
         graph.add_input(text, quiet = quiet);
         if camr:
+            anchorer = Anchorer(graph.input);
             for token in graph.input.split(" "):
-                anchoring.append(_anchor_(token));
+                anchoring.append(anchorer.find(token));
     i = 0;
     for n, v, a in zip(amr.nodes, amr.node_values, amr.attributes):
         j = i;
@@ -0,0 +1,283 @@
+import json;
+import mmap;
+import struct;
+import sys;
+from array import array;
+
+from graph import Edge, Graph, timestamp;
+
+#
+# a compact binary corpus format: a sequence of graph records, followed by a
+# table of (interned) symbols, the table of graphs, and a fixed-size trailer.
+# symbols are stored in their JSON serialization, such that any value can be
+# represented (and the conversion from and to MRP is lossless), and referred
+# to by their index into the table (or -1 for None).  each graph record is an
+# array of 32-bit integers, with a header of counts and graph properties and
+# then one column per node or edge property; node properties, node anchors,
+# and edge attributes are stored in flat arrays, indexed by offset columns.
+# any parts of nodes or edges that do not fit this scheme (e.g. anchors other
+# than character ranges, or anchorings) are kept in one additional JSON object
+# per node or edge.  all integers are little-endian.
+#
+MAGIC = b"MRPB";
+VERSION = 1;
+TRAILER = struct.Struct("<4sIQQ");
+ENTRY = struct.Struct("<QIii");
+HEADER = 12;
+
+def standard(anchors):
+  #
+  # character ranges (with keys in canonical order, for a faithful round trip)
+  #
+  return isinstance(anchors, list) \
+    and all(isinstance(anchor, dict) and list(anchor) == ["from", "to"]
+            and type(anchor["from"]) is int and type(anchor["to"]) is int
+            for anchor in anchors);
+
+def ints(values):
+  result = array("i", values);
+  if sys.byteorder != "little": result.byteswap();
+  return result;
+
+class Writer(object):
+
+  def __init__(self, stream):
+    self.stream = stream;
+    self.symbols = dict();
+    self.graphs = [];
+    self.offset = 0;
+
+  def symbol(self, value):
+    if value is None: return -1;
+    key = json.dumps(value, ensure_ascii = False);
+    return self.symbols.setdefault(key, len(self.symbols));
+
+  def write(self, graph):
+    symbol = self.symbol;
+    json = graph.encode();
+    nodes = json.get("nodes", []);
+    edges = json.get("edges", []);
+    header = [symbol(json.get("flavor")), symbol(json.get("time")),
+              symbol(json.get("language")), symbol(json.get("source")),
+              symbol(json.get("provenance")), symbol(json.get("targets")),
+              symbol(json.get("input")), len(nodes), len(edges)];
+    ids, labels, flags, extras = [], [], [], [];
+    poffsets, properties, values = [0], [], [];
+    aoffsets, starts, ends = [0], [], [];
+    for node, original in zip(nodes, graph.nodes or ()):
+      ids.append(symbol(node.pop("id")));
+      labels.append(symbol(node.pop("label", None)));
+      flags.append(1 if original.is_top else 0);
+      if isinstance(node.get("properties"), list) \
+         and isinstance(node.get("values"), list) \
+         and len(node["properties"]) == len(node["values"]) \
+         and "anchorings" not in node:
+        properties.extend(symbol(property) for property
+                          in node.pop("properties"));
+        values.extend(symbol(value) for value in node.pop("values"));
+      poffsets.append(len(properties));
+      if standard(node.get("anchors")):
+        for anchor in node.pop("anchors"):
+          starts.append(anchor["from"]); ends.append(anchor["to"]);
+      aoffsets.append(len(starts));
+      extras.append(symbol(node) if node else -1);
+    eids, sources, targets, elabels, normals, eextras = [], [], [], [], [], [];
+    qoffsets, attributes, avalues = [0], [], [];
+    for edge in edges:
+      eids.append(symbol(edge.pop("id", None)));
+      sources.append(symbol(edge.pop("source", None)));
+      targets.append(symbol(edge.pop("target", None)));
+      elabels.append(symbol(edge.pop("label", None)));
+      normals.append(symbol(edge.pop("normal", None)));
+      if isinstance(edge.get("attributes"), list) \
+         and isinstance(edge.get("values"), list) \
+         and len(edge["attributes"]) == len(edge["values"]):
+        attributes.extend(symbol(attribute) for attribute
+                          in edge.pop("attributes"));
+        avalues.extend(symbol(value) for value in edge.pop("values"));
+      qoffsets.append(len(attributes));
+      eextras.append(symbol(edge) if edge else -1);
+    header.extend([len(properties), len(starts), len(attributes)]);
+    record = ints(header + ids + labels + flags + extras
+                  + poffsets + properties + values
+                  + aoffsets + starts + ends
+                  + eids + sources + targets + elabels + normals + eextras
+                  + qoffsets + attributes + avalues).tobytes();
+    self.stream.write(record);
+    self.graphs.append((self.offset, len(record),
+                        symbol(json["id"]), symbol(json.get("framework"))));
+    self.offset += len(record);
+
+  def close(self):
+    strings = self.offset;
+    blobs = [key.encode("utf-8") for key in self.symbols];
+    offsets = array("q", [0]);
+    for blob in blobs: offsets.append(offsets[-1] + len(blob));
+    if sys.byteorder != "little": offsets.byteswap();
+    self.stream.write(struct.pack("<Q", len(blobs)));
+    self.stream.write(offsets.tobytes());
+    for blob in blobs: self.stream.write(blob);
+    graphs = strings + 8 + len(offsets) * 8 + sum(len(blob) for blob in blobs);
+    self.stream.write(struct.pack("<Q", len(self.graphs)));
+    for entry in self.graphs: self.stream.write(ENTRY.pack(*entry));
+    self.stream.write(TRAILER.pack(MAGIC, VERSION, strings, graphs));
+    self.stream.flush();
+
+class Symbols(dict):
+  #
+  # decode symbols on demand; strings and other atomic values are shared among
+  # all graphs, whereas lists and objects are decoded afresh on each access, as
+  # they may be modified later on.
+  #
+  def __init__(self, buffer, base, offsets):
+    super().__init__();
+    self.buffer = buffer;
+    self.base = base;
+    self.offsets = offsets;
+    self[-1] = None;
+
+  def __missing__(self, i):
+    start, end = self.base + self.offsets[i], self.base + self.offsets[i + 1];
+    value = json.loads(bytes(self.buffer[start:end]).decode("utf-8"));
+    if not isinstance(value, (list, dict)): self[i] = value;
+    return value;
+
+class Reader(object):
+
+  def __init__(self, buffer):
+    self.buffer = buffer;
+    if len(buffer) < TRAILER.size:
+      raise ValueError("codec.binary.read(): truncated input");
+    magic, version, strings, graphs \
+      = TRAILER.unpack_from(buffer, len(buffer) - TRAILER.size);
+    if magic != MAGIC or version != VERSION:
+      raise ValueError("codec.binary.read(): invalid input "
+                       "(magic {}; version {})".format(magic, version));
+    n, = struct.unpack_from("<Q", buffer, strings);
+    self.offsets = array("q", buffer[strings + 8:strings + 8 + (n + 1) * 8]);
+    if sys.byteorder != "little": self.offsets.byteswap();
+    self.symbols = Symbols(buffer, strings + 8 + (n + 1) * 8, self.offsets);
+    n, = struct.unpack_from("<Q", buffer, graphs);
+    self.entries = list(ENTRY.iter_unpack(buffer[graphs + 8:
+                                                 graphs + 8 + n * ENTRY.size]));
+
+  def __len__(self):
+    return len(self.entries);
+
+  def symbol(self, i):
+    return self.symbols[i];
+
+  def id(self, k):
+    return self.symbol(self.entries[k][2]);
+
+  def framework(self, k):
+    return self.symbol(self.entries[k][3]);
+
+  def graph(self, k):
+    offset, length, id, framework = self.entries[k];
+    with memoryview(self.buffer) as view:
+      if sys.byteorder == "little":
+        record = view[offset:offset + length].cast("i").tolist();
+      else:
+        record = array("i");
+        record.frombytes(view[offset:offset + length]);
+        record.byteswap();
+        record = record.tolist();
+    symbol = self.symbols.__getitem__;
+    flavor, time, language, source, provenance, targets, input, \
+      n, m, p, a, q = record[:HEADER];
+    graph = Graph(symbol(id), symbol(flavor), symbol(framework));
+    graph.time = timestamp(symbol(time));
+    graph.input = symbol(input);
+    graph.language(symbol(language));
+    graph.source(symbol(source));
+    graph.provenance(symbol(provenance));
+    graph.targets(symbol(targets));
+    i = HEADER;
+    ids = record[i:i + n]; i += n;
+    labels = record[i:i + n]; i += n;
+    flags = record[i:i + n]; i += n;
+    extras = record[i:i + n]; i += n;
+    poffsets = record[i:i + n + 1]; i += n + 1;
+    properties = record[i:i + p]; i += p;
+    values = record[i:i + p]; i += p;
+    aoffsets = record[i:i + n + 1]; i += n + 1;
+    starts = record[i:i + a]; i += a;
+    ends = record[i:i + a]; i += a;
+    for j in range(n):
+      start, end = poffsets[j], poffsets[j + 1];
+      if start < end:
+        names = [symbol(property) for property in properties[start:end]];
+        contents = [symbol(value) for value in values[start:end]];
+      else:
+        names = contents = None;
+      start, end = aoffsets[j], aoffsets[j + 1];
+      if start < end:
+        anchors = [{"from": starts[l], "to": ends[l]}
+                   for l in range(start, end)];
+      else:
+        anchors = None;
+      anchorings = None;
+      if extras[j] >= 0:
+        extra = symbol(extras[j]);
+        if "properties" in extra: names = extra["properties"];
+        if "values" in extra: contents = extra["values"];
+        if "anchors" in extra: anchors = extra["anchors"];
+        anchorings = extra.get("anchorings");
+      graph.add_node(symbol(ids[j]), symbol(labels[j]), names, contents,
+                     anchors, top = flags[j] == 1, anchorings = anchorings);
+    eids = record[i:i + m]; i += m;
+    sources = record[i:i + m]; i += m;
+    targets = record[i:i + m]; i += m;
+    labels = record[i:i + m]; i += m;
+    normals = record[i:i + m]; i += m;
+    extras = record[i:i + m]; i += m;
+    qoffsets = record[i:i + m + 1]; i += m + 1;
+    attributes = record[i:i + q]; i += q;
+    values = record[i:i + q]; i += q;
+    for j in range(m):
+      start, end = qoffsets[j], qoffsets[j + 1];
+      if start < end:
+        names = [symbol(attribute) for attribute in attributes[start:end]];
+        contents = [symbol(value) for value in values[start:end]];
+      else:
+        names = contents = None;
+      anchors = None;
+      if extras[j] >= 0:
+        extra = symbol(extras[j]);
+        if "attributes" in extra: names = extra["attributes"];
+        if "values" in extra: contents = extra["values"];
+        anchors = extra.get("anchors");
+      label = symbol(labels[j]);
+      graph.store_edge(Edge(symbol(eids[j]),
+                            symbol(sources[j]), symbol(targets[j]),
+                            label if label != "" else None,
+                            symbol(normals[j]), names, contents, anchors),
+                       robust = True);
+    return graph;
+
+def read(fp, ids = None, frameworks = None, position = None):
+  name = getattr(fp, "name", None);
+  stream = None;
+  try:
+    stream = open(name, "rb");
+    buffer = mmap.mmap(stream.fileno(), 0, access = mmap.ACCESS_READ);
+  except:
+    #
+    # not a regular (non-empty) file, e.g. a pipe: read everything into memory
+    #
+    if stream is not None: stream.close();
+    stream = None;
+    buffer = getattr(fp, "buffer", fp).read();
+  reader = Reader(buffer);
+  selection = [k for k in range(len(reader))
+               if (ids is None or reader.id(k) in ids)
+               and (frameworks is None or reader.framework(k) in frameworks)];
+  if position is not None: selection = selection[position:position + 1];
+  try:
+    for k in selection:
+      yield reader.graph(k), None;
+  finally:
+    if stream is not None:
+      buffer.close();
+      stream.close();
@@ -1,6 +1,7 @@
 import re;
 import sys;
 
+from anchoring import Anchorer;
 from graph import Graph;
 
 TEXT = re.compile(r"^# text = (.+)$");
@@ -108,36 +109,10 @@ def read_anchors(stream):
       yield id, tokens;
 
 def construct_graph_nodes(id, input, tuples, framework, text, anchors):
-  i = 0;
-  def compute(form):
-    nonlocal i;
-    m = None;
-    j = input.find(form, i);
-    if j >= i:
-      i, m = j, len(form);
-    else:
-      base = form;
-      k, l = len(input), 0;
-      for old, new in {("‘", "`"), ("‘", "'"), ("’", "'"), ("`", "'"),
-                       ("“", "\""), ("”", "\""),
-                       ("–", "--"), ("–", "---"), ("—", "---"),
-                       ("…", "..."), ("…", ". . .")}:
-        form = base.replace(old, new);
-        j = input.find(form, i);
-        if j >= i and j < k: k, l = j, len(form);
-      if k < len(input): i, m = k, l;
-    if m:
-      match = {"from": i, "to": i + m};
-      i += m;
-      return match;
-    else:
-      raise Exception("[{}] failed to anchor |{}| in |{}|{}| ({})"
-                      "".format(graph.id, form, input[:i], input[i:], i));
-
   graph = Graph(id, flavor = 0, framework = framework);
   if input is not None: graph.add_input(input);
   elif text is not None: graph.add_input(text);
-  input = graph.input;
+  anchorer = Anchorer(graph.input, graph.id);
 
   anchors_generator = read_anchors(anchors);
   _, anchors_tokens = next(anchors_generator);
@@ -169,7 +144,7 @@ def construct_graph_nodes(id, input, tuples, framework, text, anchors):
       if match:
         anchors = [{"from": int(match.group(1)), "to": int(match.group(2))}];
       else:
-        anchors = [compute(form)];
+        anchors = [anchorer.find(form)];
     graph.add_node(id, label = form,
                    properties = list(properties.keys()),
                    values = list(properties.values()),
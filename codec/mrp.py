@@ -1,55 +1,72 @@
 import json;
+import multiprocessing as mp;
 import operator;
 import os;
+import queue;
 import sys;
+import tempfile;
+import threading;
+from collections import deque;
 
+from anchoring import Anchorer;
 from graph import Graph
 
-def read(fp, text = None, robust = False):
-  input, i = None, 0;
-  def compute(form):
-    nonlocal i;
-    m = None;
-    j = input.find(form, i);
-    if j >= i:
-      i, m = j, len(form);
-    else:
-      base = form;
-      k, l = len(input), 0;
-      for old, new in {("‘", "`"), ("‘", "'"), ("’", "'"), ("`", "'"),
-                       ("“", "\""), ("”", "\""),
-                       ("–", "--"), ("–", "---"), ("—", "---"),
-                       ("…", "..."), ("…", ". . .")}:
-        form = base.replace(old, new);
-        j = input.find(form, i);
-        if j >= i and j < k: k, l = j, len(form);
-      if k < len(input): i, m = k, l;
-    if m:
-      match = {"from": i, "to": i + m}; 
-      i += m;
-      return match;
-    else:
-      raise Exception("failed to anchor |{}| in |{}|{}| ({})"
-                      "".format(form, input[:i], input[i:], i));
+try:
+  import orjson;
+except ImportError:
+  orjson = None;
 
+CHUNK = 1 << 20;
+WINDOW = 8;
+
+#
+# unlike json.dumps() with non-default arguments, which instantiates a fresh
+# encoder on every call, share one encoder for all output; the accelerated
+# serializer is not used here, as its (compact) output differs from json.dump()
+#
+ENCODER = json.JSONEncoder(ensure_ascii = False);
+
+def loads(line):
+  #
+  # use an accelerated JSON parser where available; it is stricter than the
+  # standard library on some inputs (e.g. NaN or integers beyond 64 bits), in
+  # which case we fall back to the standard parser.
+  #
+  if orjson is not None:
+    try:
+      return orjson.loads(line);
+    except orjson.JSONDecodeError:
+      pass;
+  return json.loads(line);
+
+def read(fp, text = None, robust = False,
+         ids = None, frameworks = None, position = None, cores = 1,
+         lazy = False, normalize = None, trace = 0):
   def anchor(graph, old, new):
-    nonlocal input, i;
     strings = dict();
     for node in graph.nodes:
       for j in range(len(node.anchors) if node.anchors else 0):
         start, end = node.anchors[j]["from"], node.anchors[j]["to"];
         strings[(start, end)] = old[start:end];
-    input, i = new, 0;
+    anchorer = Anchorer(new);
     for key in sorted(strings.keys(), key = operator.itemgetter(0, 1)):
-      strings[key] = compute(strings[key]);
+      strings[key] = anchorer.find(strings[key]);
     for node in graph.nodes:
       for j in range(len(node.anchors) if node.anchors else 0):
         node.anchors[j] \
           = strings[(node.anchors[j]["from"], node.anchors[j]["to"])];
 
-  for j, line in enumerate(fp):
+  def decode(j, line):
+    try:
+      graph = Graph.decode(loads(line), robust = robust, lazy = lazy);
+    except Exception as error:
+      print("codec.mrp.read(): ignoring line {}: {}"
+            "".format(j, error), file = sys.stderr);
+      return None;
+    return finish(j, graph);
+
+  def finish(j, graph):
     try:
-      graph = Graph.decode(json.loads(line.rstrip()), robust = robust);
       if text is not None:
         if graph.input in text:
           graph.id = text[graph.input];
@@ -57,7 +74,291 @@ def read(fp, text = None, robust = False):
           old = graph.input;
           graph.add_input(text);
           anchor(graph, old, graph.input);
-      yield graph, None;
+      return graph;
     except Exception as error:
       print("codec.mrp.read(): ignoring line {}: {}"
             "".format(j, error), file = sys.stderr);
+
+  def normal(j, graph):
+    #
+    # normalization (where requested) follows re-anchoring against .text.,
+    # and is only applied to graphs that are actually selected; unlike input
+    # that fails to decode, a failure to normalize is fatal.
+    #
+    try:
+      graph.normalize(normalize, trace);
+    except Exception as error:
+      abort(j, graph.id, error);
+
+  #
+  # when selecting graphs by identifier or position, seek directly to the
+  # relevant lines via the index, unless reading from a pipe or rewriting
+  # identifiers (from .text.), where all lines have to be decoded in turn.
+  #
+  name = getattr(fp, "name", None);
+  entries = None;
+  if (ids is not None or position is not None) and text is None \
+     and isinstance(name, str) and os.path.isfile(name):
+    try:
+      entries = index(name);
+    except Exception as error:
+      print("codec.mrp.read(): unable to index ‘{}’: {}"
+            "".format(name, error), file = sys.stderr);
+  if entries is not None:
+    selection = [(j, offset, length)
+                 for j, (id, framework, offset, length) in enumerate(entries)
+                 if (ids is None or id in ids)
+                 and (frameworks is None or framework in frameworks)];
+    #
+    # as when reading sequentially, a position counts only graphs that decode
+    #
+    k = 0;
+    with open(name, "rb") as stream:
+      for j, offset, length in selection:
+        stream.seek(offset);
+        graph = decode(j, stream.read(length).decode("utf-8"));
+        if graph is None: continue;
+        if position is not None and k < position:
+          k += 1;
+          continue;
+        if normalize: normal(j, graph);
+        yield graph, None;
+        if position is not None: return;
+    return;
+
+  #
+  # otherwise, given multiple cores and a file to read from, have a pool of
+  # workers decode chunks of lines, while keeping a bounded number of chunks
+  # in flight; graphs are returned in their original order.  unless graphs
+  # are re-anchored (against .text.) or selected by position, workers also
+  # normalize the graphs of their chunks that pass the selection.
+  #
+  batch = None;
+  if cores > 1 and isinstance(name, str) and os.path.isfile(name):
+    if text is None and position is None: batch = normalize;
+    graphs = ((j, finish(j, graph))
+              for j, graph in parallel(name, cores, robust, lazy,
+                                       batch, ids, frameworks, trace));
+  else:
+    graphs = ((j, decode(j, line)) for j, line in enumerate(fp));
+
+  k = 0;
+  for j, graph in graphs:
+    if graph is None: continue;
+    if ids is not None and graph.id not in ids: continue;
+    if frameworks is not None and graph.framework not in frameworks: continue;
+    if position is not None and k < position:
+      k += 1;
+      continue;
+    if normalize and not batch: normal(j, graph);
+    yield graph, None;
+    if position is not None: return;
+
+def abort(j, id, error):
+  print("codec.mrp.read(): failed to normalize graph #{} (line {}): {}; "
+        "exit.".format(id, j, error), file = sys.stderr);
+  sys.exit(1);
+
+def chunks(name, size = CHUNK):
+  #
+  # byte ranges of at least .size. bytes (but for the last), ending in a line
+  # break or at the end of the file.
+  #
+  with open(name, "rb") as stream:
+    end = os.fstat(stream.fileno()).st_size;
+    start = 0;
+    while start < end:
+      stream.seek(min(start + size, end));
+      stream.readline();
+      stop = min(stream.tell(), end);
+      yield start, stop;
+      start = stop;
+
+def decode_chunk(name, start, end, robust = False, lazy = False,
+                 normalize = None, ids = None, frameworks = None, trace = 0):
+  #
+  # a list with, for each line, either the graph, an error message (for lines
+  # that fail to decode), or an (identifier, message) pair for graphs that
+  # fail to normalize
+  #
+  with open(name, "rb") as stream:
+    stream.seek(start);
+    lines = stream.read(end - start).split(b"\n");
+  if len(lines) > 0 and len(lines[-1]) == 0: lines.pop();
+  result = [];
+  for line in lines:
+    try:
+      graph = Graph.decode(loads(line), robust = robust, lazy = lazy);
+    except Exception as error:
+      result.append(str(error));
+      continue;
+    if normalize \
+       and (ids is None or graph.id in ids) \
+       and (frameworks is None or graph.framework in frameworks):
+      try:
+        graph.normalize(normalize, trace);
+      except Exception as error:
+        result.append((graph.id, str(error)));
+        continue;
+    result.append(graph);
+  return result;
+
+def parallel(name, cores, robust = False, lazy = False,
+             normalize = None, ids = None, frameworks = None, trace = 0):
+  #
+  # yield (line number, graph) pairs, in order, for all lines that decode
+  #
+  def results(chunk):
+    nonlocal j;
+    for graph in chunk.get():
+      if isinstance(graph, str):
+        print("codec.mrp.read(): ignoring line {}: {}"
+              "".format(j, graph), file = sys.stderr);
+      elif isinstance(graph, tuple):
+        abort(j, *graph);
+      else:
+        yield j, graph;
+      j += 1;
+
+  pool = mp.Pool(cores);
+  try:
+    pending = deque();
+    j = 0;
+    for start, end in chunks(name):
+      pending.append(pool.apply_async(decode_chunk,
+                                      (name, start, end, robust, lazy,
+                                       normalize, ids, frameworks, trace)));
+      if len(pending) >= 2 * cores:
+        yield from results(pending.popleft());
+    while pending:
+      yield from results(pending.popleft());
+  finally:
+    pool.terminate();
+    pool.join();
+
+def index(name):
+  #
+  # an index of an MRP file records, for each line, the graph identifier and
+  # framework, as well as its byte offset and length.  the index is stored in
+  # a sidecar file, which is rebuilt whenever its header does not match the
+  # size and modification time of the MRP file; where the sidecar cannot be
+  # written (e.g. in a read-only directory), the index is only used in memory.
+  #
+  path = name + ".idx";
+  status = os.stat(name);
+  header = {"size": status.st_size, "mtime": status.st_mtime_ns};
+  if os.path.isfile(path):
+    try:
+      with open(path, encoding = "utf-8") as stream:
+        first = json.loads(stream.readline());
+        n = first.pop("count", None);
+        if first == header:
+          entries = [tuple(json.loads(line)) for line in stream];
+          if len(entries) == n: return entries;
+    except:
+      pass;
+  entries = [];
+  offset = 0;
+  with open(name, "rb") as stream:
+    for line in stream:
+      id = framework = None;
+      try:
+        graph = loads(line);
+        id, framework = graph.get("id"), graph.get("framework");
+      except:
+        pass;
+      entries.append((id, framework, offset, len(line)));
+      offset += len(line);
+  header["count"] = len(entries);
+  if os.access(os.path.dirname(path) or ".", os.W_OK):
+    try:
+      save(path, [json.dumps(header)]
+                 + [json.dumps(entry) for entry in entries]);
+    except:
+      pass;
+  return entries;
+
+def save(path, lines):
+  #
+  # write a sidecar file atomically, via a temporary file in the same
+  # directory, such that concurrent (or interrupted) runs never leave a
+  # partial file behind
+  #
+  directory, base = os.path.split(path);
+  handle, temporary = tempfile.mkstemp(prefix = base + ".",
+                                       dir = directory or ".");
+  try:
+    with os.fdopen(handle, "w", encoding = "utf-8") as stream:
+      for line in lines:
+        stream.write(line);
+        stream.write("\n");
+    #
+    # unlike mkstemp(), give the sidecar the same permissions as open() would
+    #
+    mask = os.umask(0);
+    os.umask(mask);
+    os.chmod(temporary, 0o666 & ~mask);
+    os.replace(temporary, path);
+  except:
+    try:
+      os.unlink(temporary);
+    except OSError:
+      pass;
+    raise;
+
+class Writer(object):
+  #
+  # serialize graphs into a buffer, which is written out in large chunks, if
+  # so requested from a separate thread; output is the same as from calling
+  # json.dump() on each graph, but one-shot encoding (see ENCODER) avoids the
+  # chunk by chunk writes of the former.
+  #
+  def __init__(self, stream, version = 1.1, size = CHUNK, thread = False):
+    self.stream = stream;
+    self.version = version;
+    self.size = size;
+    self.lines = [];
+    self.n = 0;
+    self.queue = self.thread = self.error = None;
+    if thread:
+      self.queue = queue.Queue(WINDOW);
+      self.thread = threading.Thread(target = self.drain, daemon = True);
+      self.thread.start();
+
+  def write(self, graph):
+    line = ENCODER.encode(graph.encode(self.version));
+    self.lines.append(line);
+    self.n += len(line) + 1;
+    if self.n >= self.size: self.flush();
+
+  def flush(self):
+    if self.error is not None: raise self.error;
+    if self.lines:
+      chunk = "\n".join(self.lines) + "\n";
+      self.lines = [];
+      self.n = 0;
+      if self.queue is not None: self.queue.put(chunk);
+      else: self.stream.write(chunk);
+
+  def drain(self):
+    while True:
+      chunk = self.queue.get();
+      if chunk is None: break;
+      if self.error is None:
+        try:
+          self.stream.write(chunk);
+        except Exception as error:
+          #
+          # keep consuming the queue, such that the producer cannot block, and
+          # report the error on the next flush() or close()
+          #
+          self.error = error;
+
+  def close(self):
+    self.flush();
+    if self.thread is not None:
+      self.queue.put(None);
+      self.thread.join();
+      self.thread = None;
+      if self.error is not None: raise self.error;
+    self.stream.flush();
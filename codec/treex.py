@@ -3,6 +3,7 @@ import os.path;
 import re;
 import xml.etree.ElementTree as ET;
 
+from anchoring import Anchorer;
 from graph import Graph;
 
 def walk(id, node, parent, nodes, edges, ns):
@@ -30,49 +31,6 @@ def walk(id, node, parent, nodes, edges, ns):
 def read(fp, text = None):
   ns = "{http://ufal.mff.cuni.cz/pdt/pml/}";
 
-  #
-  # _fix_me_
-  # factor out the anchor()ing code into a reusable form.        (oe; 4-apr-20)
-  #
-  n = None;
-  i = 0;
-
-  def skip():
-    nonlocal i;
-    while i < n and graph.input[i] in {" ", "\t"}:
-      i += 1;
-
-  def scan(candidates):
-    for candidate in candidates:
-      if graph.input.startswith(candidate, i):
-        return len(candidate);
-
-  def anchor(form):
-    nonlocal i;
-    skip();
-    m = None;
-    if graph.input.startswith(form, i):
-      m = len(form);
-    else:
-      for old, new in {("‘", "`"), ("’", "'")}:
-        form = form.replace(old, new);
-        if graph.input.startswith(form, i):
-          m = len(form);
-          break;
-      if not m:
-        m = scan({"“", "\"", "``"}) or scan({"‘", "`"}) \
-            or scan({"”", "\"", "''"}) or scan({"’", "'"}) \
-            or scan({"—", "—", "---", "--"}) \
-            or scan({"…", "...", ". . ."});
-    if m:
-      anchor = {"from": i, "to": i + m};
-      i += m;
-      skip();
-      return anchor;
-    else:
-      raise Exception("{}: failed to anchor |{}| in |{}| ({})"
-                      "".format(graph.id, form, graph.input, i));
-
   tree = ET.parse(fp).getroot();
   bundles = tree.find(ns + "bundles");
   for item in bundles.findall(ns + "LM"):
@@ -101,10 +59,9 @@ def read(fp, text = None):
     anchoring = dict();
     if sentence is not None:
       graph.add_input(sentence);
-      n = len(graph.input);
-      i = 0;
+      anchorer = Anchorer(graph.input, graph.id);
       for node in sorted(surface, key = itemgetter(1)):
-        anchoring[node[0]] = anchor(node[2].findtext(ns + "form"));
+        anchoring[node[0]] = anchorer.match(node[2].findtext(ns + "form"));
 
     #
     # now process tectogrammatical nodes in surface order (as indicated in the
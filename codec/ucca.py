@@ -5,6 +5,7 @@ from itertools import groupby
 from operator import attrgetter;
 from pathlib import Path;
 
+from anchoring import Anchorer;
 from graph import Graph;
 from ucca import core, layer0, layer1, textutil;
 from ucca.convert import to_standard
@@ -27,47 +28,12 @@ def passage2graph(passage, text=None, prefix=None):
     l1 = passage.layer(layer1.LAYER_ID);
     unit_id_to_node_id = {};
 
-    n = None;
+    anchorer = None;
     if text:
         graph.add_input(text);
-        n = len(graph.input);
-    i = 0;
-
-    def skip():
-        nonlocal i;
-        while i < n and graph.input[i] in {" ", "\t"}:
-            i += 1;
-
-    def scan(candidates):
-        for candidate in candidates:
-            if graph.input.startswith(candidate, i):
-                return len(candidate);
-
-    def anchor(form):
-        nonlocal i;
-        skip();
-        m = None;
-        if graph.input.startswith(form, i):
-            m = len(form);
-        else:
-            for old, new in {("‘", "`"), ("’", "'")}:
-                form = form.replace(old, new);
-                if graph.input.startswith(form, i):
-                    m = len(form);
-                    break;
-            if not m:
-                m = scan({"“", "\"", "``"}) or scan({"‘", "`"}) \
-                    or scan({"”", "\"", "''"}) or scan({"’", "'"}) \
-                    or scan({"—", "—", "---", "--"}) \
-                    or scan({"…", "...", ". . ."});
-        if m:
-            anchor = {"from": i, "to": i + m};
-            i += m;
-            skip();
-            return anchor;
-        else:
-            raise Exception("{}: failed to anchor |{}| in |{}| ({})"
-                            "".format(graph.id, form, graph.input, i));
+        if graph.input is None:
+            raise Exception("{}: no input text".format(graph.id));
+        anchorer = Anchorer(graph.input, graph.id);
 
     non_terminals = [unit for unit in l1.all if unit.tag in (layer1.NodeTags.Foundational, layer1.NodeTags.Punctuation)]
     for token in sorted(l0.all, key=attrgetter("position")):
@@ -78,9 +44,9 @@ def passage2graph(passage, text=None, prefix=None):
                         if unit.ID in unit_id_to_node_id:
                             node = graph.find_node(unit_id_to_node_id[unit.ID]);
                             if graph.input:
-                                node.anchors.append(anchor(token.text));
+                                node.anchors.append(anchorer.match(token.text));
                         else:
-                            node = graph.add_node(anchors=[anchor(token.text)] if graph.input else None);
+                            node = graph.add_node(anchors=[anchorer.match(token.text)] if graph.input else None);
                             unit_id_to_node_id[unit.ID] = node.id;
     for unit in sorted(non_terminals, key=attrgetter("start_position", "end_position")):
         if not unit.attrib.get("implicit") and unit.ID not in unit_id_to_node_id:
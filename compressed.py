@@ -0,0 +1,178 @@
+import atexit;
+import bz2;
+import gzip;
+import io;
+import lzma;
+import os;
+import queue;
+import shutil;
+import sys;
+import tempfile;
+import threading;
+import time;
+import zipfile;
+from zipfile import ZipFile;
+
+try:
+  import zstandard;
+except ImportError:
+  zstandard = None;
+
+#
+# transparent (de)compression of input and output streams, determined by the
+# file name suffix or (for input) the leading ‘magic’ bytes.  decompression
+# runs in a background thread, such that it overlaps with decoding of graphs.
+#
+ENCODING = "utf-8";
+CHUNK = 1 << 20;
+WINDOW = 8;
+MAGIC = {b"\x1f\x8b": "gzip", b"BZh": "bz2", b"\xfd7zXZ\x00": "xz",
+         b"\x28\xb5\x2f\xfd": "zstd", b"PK\x03\x04": "zip"};
+SUFFIXES = {".gz": "gzip", ".bz2": "bz2", ".xz": "xz",
+            ".zst": "zstd", ".zip": "zip"};
+
+def compression(name, stream = None):
+  for suffix, method in SUFFIXES.items():
+    if name.endswith(suffix): return method;
+  if stream is not None and hasattr(stream, "peek"):
+    head = stream.peek(6);
+    for magic, method in MAGIC.items():
+      if head.startswith(magic): return method;
+
+class Prefetch(io.RawIOBase):
+
+  def __init__(self, chunks, window = WINDOW):
+    self.queue = queue.Queue(window);
+    self.chunk = b"";
+    self.done = False;
+    thread = threading.Thread(target = self.fill, args = (chunks,),
+                              daemon = True);
+    thread.start();
+
+  def fill(self, chunks):
+    try:
+      for chunk in chunks:
+        if len(chunk) > 0: self.queue.put(memoryview(chunk));
+    except Exception as error:
+      self.queue.put(error);
+    self.queue.put(None);
+
+  def readable(self):
+    return True;
+
+  def readinto(self, buffer):
+    while len(self.chunk) == 0 and not self.done:
+      chunk = self.queue.get();
+      if chunk is None: self.done = True;
+      elif isinstance(chunk, Exception): raise chunk;
+      else: self.chunk = chunk;
+    n = min(len(buffer), len(self.chunk));
+    buffer[:n] = self.chunk[:n];
+    self.chunk = self.chunk[n:];
+    return n;
+
+def chunks(stream):
+  with stream:
+    while True:
+      chunk = stream.read(CHUNK);
+      if not chunk: break;
+      yield chunk;
+
+def entries(file):
+  #
+  # all MRP entries of a zip archive, in order, as one stream of lines
+  #
+  with ZipFile(file) as zip:
+    for entry in zip.namelist():
+      if entry.endswith(".mrp"):
+        last = b"\n";
+        for chunk in chunks(zip.open(entry)):
+          yield chunk;
+          last = chunk[-1:];
+        if last != b"\n": yield b"\n";
+
+def reader(stream):
+  name = getattr(stream, "name", "");
+  if not isinstance(name, str): name = "";
+  raw = getattr(stream, "buffer", None);
+  method = compression(name, raw);
+  if method is None: return stream;
+  if method == "zip":
+    #
+    # zip archives need random access; where the input is not a file (e.g. a
+    # pipe), spool it to a temporary file first
+    #
+    if raw is None: file = name;
+    elif raw.seekable(): file = raw;
+    else:
+      file = tempfile.TemporaryFile();
+      shutil.copyfileobj(raw, file, CHUNK);
+      file.seek(0);
+    with ZipFile(file) as zip:
+      if not any(entry.endswith(".mrp") for entry in zip.namelist()):
+        print("compressed.reader(): missing MRP entry in ‘{}’; exit."
+              "".format(name), file = sys.stderr);
+        sys.exit(1);
+    if not isinstance(file, str): file.seek(0);
+    source = entries(file);
+  else:
+    if method == "zstd" and zstandard is None:
+      print("compressed.reader(): no support for zstd compression ‘{}’; "
+            "install the ‘zstandard’ module; exit."
+            "".format(name), file = sys.stderr);
+      sys.exit(1);
+    if raw is None or not raw.readable():
+      raw = open(name, "rb");
+    if method == "gzip": source = gzip.GzipFile(fileobj = raw);
+    elif method == "bz2": source = bz2.BZ2File(raw);
+    elif method == "xz": source = lzma.LZMAFile(raw);
+    else: source = zstandard.ZstdDecompressor().stream_reader(raw);
+    source = chunks(source);
+  return io.TextIOWrapper(io.BufferedReader(Prefetch(source)),
+                          encoding = ENCODING);
+
+class ZipArchive(io.TextIOWrapper):
+
+  def __init__(self, name, entry):
+    self.zip = ZipFile(name, "w");
+    info = zipfile.ZipInfo(entry, time.localtime()[:6]);
+    info.compress_type = zipfile.ZIP_DEFLATED;
+    super().__init__(self.zip.open(info, "w", force_zip64 = True),
+                     encoding = ENCODING);
+
+  def close(self):
+    if not self.closed:
+      super().close();
+      self.zip.close();
+
+def writer(stream):
+  name = getattr(stream, "name", "");
+  if not isinstance(name, str): name = "";
+  method = compression(name);
+  if method is None: return stream;
+  if method == "zstd" and zstandard is None:
+    print("compressed.writer(): no support for zstd compression ‘{}’; "
+          "install the ‘zstandard’ module; exit."
+          "".format(name), file = sys.stderr);
+    sys.exit(1);
+  stream.close();
+  if method == "gzip": result = gzip.open(name, "wt", encoding = ENCODING);
+  elif method == "bz2": result = bz2.open(name, "wt", encoding = ENCODING);
+  elif method == "xz": result = lzma.open(name, "wt", encoding = ENCODING);
+  elif method == "zip":
+    #
+    # a single-entry archive, named after the archive itself, e.g. ‘out.zip’
+    # or ‘out.mrp.zip’ both contain ‘out.mrp’
+    #
+    entry = os.path.basename(name)[:-len(".zip")];
+    if not entry.endswith(".mrp"): entry += ".mrp";
+    result = ZipArchive(name, entry);
+  else:
+    result = io.TextIOWrapper(zstandard.ZstdCompressor()
+                              .stream_writer(io.open(name, "wb")),
+                              encoding = ENCODING);
+  #
+  # compressed output is only complete once closed, including at sys.exit()
+  #
+  atexit.register(result.close);
+  return result;
@@ -5,11 +5,13 @@
 # Stephan Oepen <oe@ifi.uio.no>
 
 from datetime import datetime;
+import hashlib;
 import html;
 import operator;
 from pathlib import Path;
 import sys;
 
+from anchoring import Anchorer;
 import score.core;
 
 #
@@ -23,21 +25,172 @@ FLAVORS = {"dm": 0, "psd": 0, "ptg": 0,
            "eds": 1, "ptg": 1, "ucca": 1,
            "amr": 2, "drg": 2};
 
+#
+# graphs in a corpus tend to share very few distinct time stamps, hence parse
+# each string only once
+#
+TIMES = dict();
+
+def timestamp(string):
+    time = TIMES.get(string);
+    if time is None:
+        try:
+            time = datetime.strptime(string, "%Y-%m-%d");
+        except:
+            time = datetime.strptime(string, "%Y-%m-%d (%H:%M)");
+        TIMES[string] = time;
+    return time;
+
+#
+# likewise, format each date only once on output (keyed by the date, as graphs
+# constructed from other formats each carry their own time of creation)
+#
+STAMPS = dict();
+
+def stamp(time):
+    day = time.date();
+    string = STAMPS.get(day);
+    if string is None:
+        string = STAMPS[day] = day.strftime("%Y-%m-%d");
+    return string;
+
+class Symbols(object):
+    #
+    # a table of interned symbols, shared by all graphs of a session: node and
+    # edge labels, property and attribute names and values are stored only once
+    # (which saves memory and makes equality tests on them cheap), and each is
+    # assigned a stable integer identifier, for use in scorers.  only strings
+    # are interned; other values are looked up by type too, as 1 == 1.0 == True.
+    #
+    def __init__(self):
+        self.ids = dict();
+        self.values = [];
+        self.lowered = dict();
+
+    def __len__(self):
+        return len(self.values);
+
+    def intern(self, value):
+        return sys.intern(value) if type(value) is str else value;
+
+    def intern_all(self, values):
+        #
+        # intern the elements of a list of values, in place
+        #
+        if type(values) is list:
+            try:
+                values[:] = map(sys.intern, values);
+            except TypeError:
+                for i, value in enumerate(values):
+                    if type(value) is str: values[i] = sys.intern(value);
+        return values;
+
+    def id(self, value):
+        key = value if type(value) is str else (type(value), value);
+        i = self.ids.get(key);
+        if i is None:
+            i = self.ids[key] = len(self.values);
+            self.values.append(self.intern(value));
+        return i;
+
+    def value(self, i):
+        return self.values[i];
+
+    def lower(self, value):
+        #
+        # the equivalent of str(value).lower(), without creating a new string
+        # for each of the (many) occurrences of the same value; unhashable
+        # values (e.g. lists) are converted afresh every time.
+        #
+        key = value if type(value) is str else (type(value), value);
+        try:
+            result = self.lowered.get(key);
+        except TypeError:
+            return str(value).lower();
+        if result is None:
+            result = self.lowered[key] = self.intern(str(value).lower());
+        return result;
+
+SYMBOLS = Symbols();
+
+#
+# the (incoming or outgoing) edges of a node are kept in a tuple, which takes
+# far less space than a set; only nodes with many edges make use of a set, to
+# avoid quadratic behavior in adding edges.  all nodes without edges share the
+# empty tuple.
+#
+EMPTY = ();
+
+def adjoin(edges, edge):
+    if isinstance(edges, tuple):
+        if edge in edges: return edges;
+        if len(edges) < 16: return edges + (edge,);
+        edges = set(edges);
+    edges.add(edge);
+    return edges;
+
+def adjacency(edges):
+    #
+    # the representation built by successive adjoin() calls, in one step
+    #
+    if not edges: return EMPTY;
+    if len(edges) > 1: edges = dict.fromkeys(edges);
+    return tuple(edges) if len(edges) <= 16 else set(edges);
+
 class Node(object):
 
+    #
+    # there can be millions of nodes (and edges) in a corpus, hence do without
+    # per-instance dictionaries
+    #
+    __slots__ = ("id", "type", "label", "properties", "values", "anchorings",
+                 "anchors", "is_top", "incoming_edges", "outgoing_edges");
+
     def __init__(self, id, label = None, properties = None, values = None,
                  anchors = None, top = False, type = 1, anchorings = None):
         self.id = id
         self.type = type;
-        self.label = label;
-        self.properties = properties;
-        self.values = values;
+        self.label = sys.intern(label) if label.__class__ is str else label;
+        self.properties = SYMBOLS.intern_all(properties);
+        self.values = SYMBOLS.intern_all(values);
         self.anchorings = anchorings;
-        self.incoming_edges = set()
-        self.outgoing_edges = set()
+        self.incoming_edges = EMPTY;
+        self.outgoing_edges = EMPTY;
         self.anchors = anchors;
         self.is_top = top
 
+    def add_incoming_edge(self, edge):
+        self.incoming_edges = adjoin(self.incoming_edges, edge);
+
+    def add_outgoing_edge(self, edge):
+        self.outgoing_edges = adjoin(self.outgoing_edges, edge);
+
+    def clear_edges(self):
+        self.incoming_edges = self.outgoing_edges = EMPTY;
+
+    def copy(self):
+        #
+        # a structural copy: the lists of properties, values, anchorings, and
+        # anchors can be modified in place, hence are copied, whereas labels,
+        # property names and values, and individual anchors are shared (only
+        # ever replaced, never modified).  edges are not copied here.
+        #
+        node = Node.__new__(Node);
+        node.id = self.id;
+        node.type = self.type;
+        node.label = self.label;
+        node.properties = list(self.properties) \
+            if self.properties is not None else None;
+        node.values = list(self.values) \
+            if self.values is not None else None;
+        node.anchorings = list(self.anchorings) \
+            if self.anchorings is not None else None;
+        node.anchors = list(self.anchors) \
+            if self.anchors is not None else None;
+        node.is_top = self.is_top;
+        node.incoming_edges = node.outgoing_edges = EMPTY;
+        return node;
+
     def set_property(self, name, value):
         if self.properties and self.values:
             try:
@@ -83,34 +236,31 @@ class Node(object):
 
     def normalize(self, actions, input = None, trace = 0):
         def union(anchors):
-            characters = set();
-            for anchor in anchors:
-                if "from" in anchor and "to" in anchor:
-                    for i in range(anchor["from"], anchor["to"]):
-                        characters.add(i);
+            #
+            # merge character ranges that overlap or are adjacent, or that are
+            # separated only by whitespace (following a range ending in it)
+            #
+            spans = sorted((anchor["from"], anchor["to"])
+                           for anchor in anchors
+                           if "from" in anchor and "to" in anchor
+                           and anchor["from"] < anchor["to"]);
             result = [];
-            last = start = None;
-            for i in sorted(characters):
-                if start is None: start = i;
-                if last is None:
-                    last = i;
-                    continue;
-                elif i == last + 1 \
-                     or all(c in score.core.SPACE for c in input[last:i]):
-                    last = i;
-                    continue;
-                else:
-                    result.append({"from": start, "to": last + 1});
-                    last = start = i;
-            if len(characters) > 0:
-                result.append({"from": start, "to": i + 1});
-            if anchors != result:
+            for start, end in spans:
+                if result:
+                    last = result[-1];
+                    if start <= last["to"] \
+                       or all(c in score.core.SPACE
+                              for c in input[last["to"] - 1:start]):
+                        if end > last["to"]: last["to"] = end;
+                        continue;
+                result.append({"from": start, "to": end});
+            if trace and anchors != result:
                 old = [anchor for anchor in anchors if anchor not in result];
                 new = [anchor for anchor in result if anchor not in anchors];
                 print("{} ==> {} [{}]".format(old, new, input),
                       file = sys.stderr);
             return result;
-        
+
         def trim(anchor, input):
             if "from" in anchor and "to" in anchor:
                 i = max(anchor["from"], 0);
@@ -134,12 +284,13 @@ class Node(object):
                 self.anchors = None;
 
         if "case" in actions:
+            lower = SYMBOLS.lower;
             if self.label is not None:
-                self.label = str(self.label).lower();
+                self.label = lower(self.label);
             if self.properties and self.values:
                 for i in range(len(self.properties)):
-                    self.properties[i] = str(self.properties[i]).lower();
-                    self.values[i] = str(self.values[i]).lower();
+                    self.properties[i] = lower(self.properties[i]);
+                    self.values[i] = lower(self.values[i]);
 
     def compare(self, node):
         #
@@ -352,17 +503,35 @@ class Node(object):
 
 class Edge(object):
 
+    __slots__ = ("id", "src", "tgt", "lab", "normal",
+                 "attributes", "values", "anchors");
+
     def __init__(self, id, src, tgt, lab, normal = None,
                  attributes = None, values = None, anchors = None):
         self.id = id;
         self.src = src;
         self.tgt = tgt;
-        self.lab = lab;
+        self.lab = sys.intern(lab) if lab.__class__ is str else lab;
         self.normal = normal;
-        self.attributes = attributes;
-        self.values = values;
+        self.attributes = SYMBOLS.intern_all(attributes);
+        self.values = SYMBOLS.intern_all(values);
         self.anchors = anchors;
 
+    def copy(self):
+        edge = Edge.__new__(Edge);
+        edge.id = self.id;
+        edge.src = self.src;
+        edge.tgt = self.tgt;
+        edge.lab = self.lab;
+        edge.normal = self.normal;
+        edge.attributes = list(self.attributes) \
+            if self.attributes is not None else None;
+        edge.values = list(self.values) \
+            if self.values is not None else None;
+        edge.anchors = list(self.anchors) \
+            if self.anchors is not None else None;
+        return edge;
+
     def is_loop(self):
         return self.src == self.tgt
 
@@ -398,14 +567,15 @@ class Edge(object):
                 self.normal = None;
 
         if "case" in actions:
+            lower = SYMBOLS.lower;
             if self.lab is not None:
-                self.lab = str(self.lab).lower();
+                self.lab = lower(self.lab);
             if self.normal is not None:
-                self.normal = str(self.normal).lower();
+                self.normal = lower(self.normal);
             if self.attributes and self.values:
                 for i in range(len(self.attributes)):
-                    self.attributes[i] = str(self.attributes[i]).lower();
-                    self.values[i] = str(self.values[i]).lower();
+                    self.attributes[i] = lower(self.attributes[i]);
+                    self.values[i] = lower(self.values[i]);
 
         if "attributes" in actions and self.attributes and self.values:
             #
@@ -504,9 +674,219 @@ class Edge(object):
     def __hash__(self):
         return hash(self.__key())
 
+class Edges(dict):
+    #
+    # a set of edges that remembers insertion order, i.e. (typically) the order
+    # of edge identifiers, such that sorting them on output takes linear time;
+    # .ordered. records whether all edges were added in order of their integer
+    # identifiers (as when decoded from MRP, or built by Graph.add_edge()), in
+    # which case output need not sort them at all.  edge identifiers must not
+    # change once an edge has been added.
+    #
+    def __init__(self):
+        super().__init__();
+        self.ordered = True;
+        self.last = None;
+
+    def add(self, edge):
+        n = len(self);
+        self[edge] = None;
+        if self.ordered and len(self) > n:
+            if type(edge.id) is not int \
+               or self.last is not None and edge.id < self.last:
+                self.ordered = False;
+            self.last = edge.id;
+
+class Compact(object):
+    #
+    # an array-backed view of a graph, for use in graph algorithms: nodes are
+    # numbered by their position in .nodes., edges by their position in .edges
+    # (in insertion order).  forward adjacency is in compressed sparse row form,
+    # i.e. the edges leaving node .i. are .forward[.offsets[i]:.offsets[i + 1]]
+    # (as indices into .edges), and likewise .backward and .roffsets for the
+    # edges entering .i.; .sources. and .targets. hold the node indices of each
+    # edge (-1 for an unknown node).  node and edge labels are interned, into
+    # .node_labels. and .edge_labels., with .symbols. mapping back to strings
+    # (and -1 for no label).  all arrays are NumPy arrays of 32-bit integers.
+    #
+    def __init__(self, graph):
+        #
+        # NumPy is only loaded when needed, to not slow down start-up time
+        #
+        import numpy as np;
+        self.nodes = list(graph.nodes);
+        self.edges = list(graph.edges);
+        self.ids = [node.id for node in self.nodes];
+        self.index = index = dict();
+        for i, id in enumerate(self.ids): index.setdefault(id, i);
+        self.symbols = [];
+        labels = dict();
+        def intern(label):
+            if label is None: return -1;
+            j = labels.get(label);
+            if j is None:
+                j = labels[label] = len(self.symbols);
+                self.symbols.append(label);
+            return j;
+        n, m = len(self.nodes), len(self.edges);
+        self.node_labels = np.fromiter((intern(node.label)
+                                        for node in self.nodes),
+                                       dtype = np.int32, count = n);
+        self.edge_labels = np.fromiter((intern(edge.lab)
+                                        for edge in self.edges),
+                                       dtype = np.int32, count = m);
+        self.sources = np.fromiter((index.get(edge.src, -1)
+                                    for edge in self.edges),
+                                   dtype = np.int32, count = m);
+        self.targets = np.fromiter((index.get(edge.tgt, -1)
+                                    for edge in self.edges),
+                                   dtype = np.int32, count = m);
+        def csr(keys):
+            order = np.argsort(keys, kind = "stable");
+            order = order[keys[order] >= 0];
+            counts = np.bincount(keys[order], minlength = n);
+            offsets = np.zeros(n + 1, dtype = np.int32);
+            np.cumsum(counts, out = offsets[1:]);
+            return order.astype(np.int32), offsets;
+        self.forward, self.offsets = csr(self.sources);
+        self.backward, self.roffsets = csr(self.targets);
+        #
+        # for algorithms in pure Python, indexing into lists is much cheaper
+        # than into (small) NumPy arrays, hence keep list copies at hand
+        #
+        self.lists = {"sources": self.sources.tolist(),
+                      "targets": self.targets.tolist(),
+                      "forward": self.forward.tolist(),
+                      "offsets": self.offsets.tolist(),
+                      "backward": self.backward.tolist(),
+                      "roffsets": self.roffsets.tolist()};
+
+    def outdegrees(self):
+        return self.offsets[1:] - self.offsets[:-1];
+
+    def indegrees(self):
+        return self.roffsets[1:] - self.roffsets[:-1];
+
+    def outgoing(self, i):
+        offsets = self.lists["offsets"];
+        return self.lists["forward"][offsets[i]:offsets[i + 1]];
+
+    def incoming(self, i):
+        offsets = self.lists["roffsets"];
+        return self.lists["backward"][offsets[i]:offsets[i + 1]];
+
+class Primitives(object):
+    #
+    # the canonical ingredients of scoring, as shared by all metrics: anchor
+    # signatures and (if there is an underlying input string) exploded anchor
+    # character sets per node, and node property and edge (attribute) tuples
+    # over node identifiers.  each is computed on first use and then cached
+    # with the graph, like the .compact. view, until the graph is modified (or
+    # normalized); .memo. extends the cache to derived, metric-specific data.
+    #
+    def __init__(self, graph):
+        self.graph = graph;
+        self.input = graph.input;
+        self.cache = dict();
+
+    def memo(self, key, function):
+        result = self.cache.get(key);
+        if result is None:
+            result = self.cache[key] = function(self.graph);
+        return result;
+
+    def anchors(self):
+        return self.memo("anchors", lambda graph:
+                         {node.id: tuple(score.core.anchor(node))
+                          for node in graph.nodes});
+
+    def exploded(self):
+        #
+        # without an input string, fall back to plain anchor signatures
+        #
+        if not self.input: return self.anchors();
+        anchors = self.anchors();
+        return self.memo("exploded", lambda graph:
+                         {id: score.core.explode(graph.input, anchor)
+                          for id, anchor in anchors.items()});
+
+    def properties(self):
+        return self.memo("properties", lambda graph:
+                         [(node.id, property, value)
+                          for node in graph.nodes if node.properties
+                          for property, value
+                          in zip(node.properties, node.values or ())]);
+
+    def edges(self):
+        return self.memo("edges", lambda graph:
+                         [(edge.src, edge.tgt, edge.lab)
+                          for edge in graph.edges]);
+
+    def attributes(self):
+        return self.memo("attributes", lambda graph:
+                         [(edge.src, edge.tgt, edge.lab, attribute, value)
+                          for edge in graph.edges
+                          if edge.attributes and edge.values
+                          for attribute, value
+                          in zip(edge.attributes, edge.values)]);
+
+    def refinement(self):
+        return self.memo("refinement", refine);
+
+def digest(value):
+    return hashlib.blake2b(repr(value).encode("utf-8"),
+                           digest_size = 16).hexdigest();
+
+def refine(graph):
+    #
+    # Weisfeiler-Lehman colour refinement: initially, each node is coloured by
+    # its local information (top status, label, properties, and anchors); then,
+    # in each round, the colour of a node is extended by the multisets of edge
+    # labels (including attributes) and colours of its neighbours, until the
+    # partition of nodes by colour no longer changes.  colours are digests of
+    # their ingredients, i.e. independent of node identifiers and order, and
+    # comparable across graphs (and runs).  returns a digest for the graph as
+    # a whole, together with the final colour of each node (by position).
+    #
+    primitives = graph.primitives();
+    exploded = primitives.exploded();
+    compact = graph.compact();
+    nodes = compact.nodes;
+    colors = [digest((node.is_top, node.label,
+                      sorted(repr(pair) for pair
+                             in zip(node.properties or (), node.values or ())),
+                      exploded[node.id] if node.anchors is not None else None))
+              for node in nodes];
+    labels = [digest((edge.lab,
+                      sorted(repr(pair) for pair
+                             in zip(edge.attributes or (), edge.values or ()))))
+              for edge in compact.edges];
+    sources = compact.lists["sources"];
+    targets = compact.lists["targets"];
+    n = len(set(colors));
+    for _ in range(len(nodes)):
+        outgoing = [[] for node in nodes];
+        incoming = [[] for node in nodes];
+        for label, i, j in zip(labels, sources, targets):
+            if i >= 0:
+                outgoing[i].append((label, colors[j] if j >= 0 else ""));
+            if j >= 0:
+                incoming[j].append((label, colors[i] if i >= 0 else ""));
+        colors = [digest((color, sorted(outgoing[i]), sorted(incoming[i])))
+                  for i, color in enumerate(colors)];
+        m = len(set(colors));
+        if m == n: break;
+        n = m;
+    edges = sorted((label, colors[i] if i >= 0 else "",
+                    colors[j] if j >= 0 else "")
+                   for label, i, j in zip(labels, sources, targets));
+    return digest((sorted(colors), edges)), colors;
+
 class Graph(object):
 
     def __init__(self, id, flavor = None, framework = None):
+        self._compact = None;
+        self._primitives = None;
         self.id = id;
         self.time = datetime.utcnow();
         self._language = None;
@@ -515,10 +895,28 @@ class Graph(object):
         self._targets = None;
         self.input = None;
         self.nodes = [];
-        self.edges = set();
+        self.edges = Edges();
         self.flavor = FLAVORS.get(framework) if flavor is None else flavor;
         self.framework = framework;
 
+    #
+    # node identifiers are indexed, for constant-time find_node(); the index is
+    # rebuilt whenever the .nodes. list is replaced wholesale (as in removal of
+    # singletons or sorting), and otherwise maintained by add_node().  where
+    # identifiers are not unique, the first node in the list takes precedence.
+    #
+    @property
+    def nodes(self):
+        return self._nodes;
+
+    @nodes.setter
+    def nodes(self, nodes):
+        self._nodes = nodes;
+        self.invalidate();
+        self._index = dict();
+        for node in nodes or ():
+            self._index.setdefault(node.id, node);
+
     def language(self, value = None):
         if value is not None: self._language = value;
         return self._language;
@@ -562,11 +960,43 @@ class Graph(object):
                     anchors = anchors, top = top, type = type,
                     anchorings = anchorings);
         self.nodes.append(node)
+        self._index.setdefault(node.id, node);
+        self.invalidate();
         return node
 
+    def compact(self):
+        #
+        # the array-backed view is cached, until the graph is modified through
+        # any of its methods; after changing nodes or edges directly, call
+        # invalidate() to force recomputation.
+        #
+        if self._compact is None: self._compact = Compact(self);
+        return self._compact;
+
+    def primitives(self):
+        #
+        # scoring primitives are cached likewise, but also depend on the input
+        #
+        if self._primitives is None \
+           or self._primitives.input is not self.input:
+            self._primitives = Primitives(self);
+        return self._primitives;
+
+    def invalidate(self):
+        self._compact = None;
+        self._primitives = None;
+
+    def fingerprint(self):
+        #
+        # a canonical hash of the graph (see refine() above): isomorphic graphs
+        # (disregarding node identifiers and order) have the same fingerprint;
+        # the converse holds but for rare, highly regular graphs, hence where
+        # it matters, a correspondence between the graphs should be confirmed.
+        #
+        return self.primitives().refinement()[0];
+
     def find_node(self, id):
-        for node in self.nodes:
-            if node.id == id: return node;
+        return self._index.get(id);
 
     def add_edge(self, src, tgt, lab, normal = None,
                  attributes = None, values = None, anchors = None):
@@ -575,18 +1005,19 @@ class Graph(object):
 
     def store_edge(self, edge, robust = False):
         self.edges.add(edge)
+        self.invalidate();
         source = self.find_node(edge.src);
         if source is None and not robust:
             raise ValueError("Graph.add_edge(): graph #{}: "
                              "invalid source node {}."
                              "".format(self.id, self.src))
-        if source: source.outgoing_edges.add(edge)
+        if source: source.add_outgoing_edge(edge)
         target = self.find_node(edge.tgt);
         if target is None and not robust:
             raise ValueError("Graph.add_edge(): graph #{}: "
                              "invalid target node {}."
                              "".format(self.id, self.tgt))
-        if target: target.incoming_edges.add(edge)
+        if target: target.add_incoming_edge(edge)
         return edge
 
     def add_input(self, text, id = None, quiet = False):
@@ -612,68 +1043,34 @@ class Graph(object):
                       file = sys.stderr);
 
     def anchor(self):
-        n = len(self.input);
-        i = 0;
-
-        def skip():
-            nonlocal i;
-            while i < n and self.input[i] in {" ", "\t"}:
-                i += 1;
-
-        def scan(candidates):
-            for candidate in candidates:
-                if self.input.startswith(candidate, i):
-                    return len(candidate);
-
-        skip();
+        self.invalidate();
+        anchorer = Anchorer(self.input);
         for node in self.nodes:
             for j in range(len(node.anchors) if node.anchors else 0):
                 if isinstance(node.anchors[j], str):
-                    form = node.anchors[j];
-                    m = None;
-                    if self.input.startswith(form, i):
-                        m = len(form);
-                    else:
-                        for old, new in {("‘", "`"), ("’", "'"), ("`", "'"),
-                                         ("“", "\""), ("”", "\"")}:
-                            form = form.replace(old, new);
-                            if self.input.startswith(form, i):
-                                m = len(form);
-                                break;
-                    #
-                    # _fix_me_
-                    # the block below looks weird: it would seem to accept any
-                    # of the punctuation marks given to scan(), irrespective
-                    # of the current .form. value?             (oe; 27-apr-20)
-                    #
-                    if not m:
-                        m = scan({"“", "\"", "``"}) or scan({"‘", "`"}) \
-                            or scan({"”", "\"", "''"}) or scan({"’", "'"}) \
-                            or scan({"—", "—", "---", "--"}) \
-                            or scan({"…", "...", ". . ."});
-                    if m:
-                        node.anchors[j] = {"from": i, "to": i + m};
-                        i += m;
-                        skip();
-                    else:
-                        raise Exception("failed to anchor |{}| in |{}| ({})"
-                                        "".format(form, self.input, i));
+                    node.anchors[j] = anchorer.match(node.anchors[j]);
 
     def normalize(self, actions, trace = 0):
+        self.invalidate();
         for node in self.nodes:
             node.normalize(actions, self.input, trace);
         for edge in self.edges:
             edge.normalize(actions, trace);
         #
-        # recompute cached edge relations, to reflect the new state of affairs
+        # recompute cached edge relations, to reflect the new state of affairs,
+        # in one sweep over all edges (rather than adding edges one at a time)
         #
         if "edges" in actions:
-            for node in self.nodes:
-                node.outgoing_edges.clear();
-                node.incoming_edges.clear();
+            outgoing = dict();
+            incoming = dict();
             for edge in self.edges:
-                self.find_node(edge.src).outgoing_edges.add(edge);
-                self.find_node(edge.tgt).incoming_edges.add(edge);
+                outgoing.setdefault(edge.src, []).append(edge);
+                incoming.setdefault(edge.tgt, []).append(edge);
+            for node in self.nodes:
+                node.clear_edges();
+            for id, node in self._index.items():
+                node.outgoing_edges = adjacency(outgoing.get(id));
+                node.incoming_edges = adjacency(incoming.get(id));
 
     def prettify(self, trace = 0):
         if self.framework == "drg":
@@ -718,136 +1115,106 @@ class Graph(object):
         #
         # all tuples use node identifiers from the gold graph, where there is
         # a correspondence; otherwise we (appear to) synthesize new unique
-        # identifiers for remaining nodes from both graphs.
+        # identifiers for remaining nodes from both graphs.  for each graph,
+        # .natives. is the inverse of .identities., mapping 'corresponding'
+        # identifiers back to the original nodes (for error attribution).
         #
         identities1 = dict();
         identities2 = dict();
+        natives1 = dict();
+        natives2 = dict();
         for i, pair in enumerate(correspondences.items()):
-            identities1[self.nodes[pair[0]].id] = i;
+            id = self.nodes[pair[0]].id;
+            identities1[id] = i;
+            natives1[i] = id;
             if pair[1] >= 0:
-                identities2[graph.nodes[pair[1]].id] = i;
+                id = graph.nodes[pair[1]].id;
+                identities2[id] = i;
+                natives2[i] = id;
         i = len(correspondences);
         for node in self.nodes:
             if node.id not in identities1:
                 identities1[node.id] = i;
+                natives1[i] = node.id;
                 i += 1;
         for node in graph.nodes:
             if node.id not in identities2:
                 identities2[node.id] = i;
+                natives2[i] = node.id;
                 i += 1;
 
-        #
-        # map 'corresponding' identifiers back to the original graphs
-        #
-        def native(id, identities):
-            for key, value in identities.items():
-                if id == value: return key;
-
         def tuples(graph, identities):
             #
             # .identities. is a hash table mapping node identifiers into the
             # 'corresponding' identifier space, such that paired nodes (and
-            # only these) share the same identifier.
+            # only these) share the same identifier.  the remaining ingredients
+            # are independent of the correspondence, hence cached per graph.
             #
-            def identify(id):
-                return identities[id] if identities is not None else id;
+            primitives = graph.primitives();
+            exploded = primitives.exploded();
             tops = set();
             labels = set();
-            properties = set();
             anchors = set();
-            edges = set();
-            attributes = set();
             for node in graph.nodes:
-                identity = identify(node.id);
+                identity = identities[node.id];
                 if node.is_top: tops.add(identity);
                 if node.label is not None: labels.add((identity, node.label));
-                if node.properties is not None:
-                    for property, value in zip(node.properties, node.values):
-                        properties.add((identity, property, value.lower()));
                 if node.anchors is not None:
-                    anchor = score.core.anchor(node);
-                    if graph.input:
-                        anchor = score.core.explode(graph.input, anchor);
-                    else:
-                        anchor = tuple(anchor);
-                    anchors.add((identity, anchor));
-            for edge in graph.edges:
-                identity \
-                    = (identify(edge.src), identify(edge.tgt), edge.lab);
-                edges.add(identity);
-                if edge.attributes and edge.values:
-                    for attribute, value in zip(edge.attributes, edge.values):
-                        attributes.add(tuple(list(identity) + [attribute, value]));
+                    anchors.add((identity, exploded[node.id]));
+            properties = {(identities[id], property, value)
+                          for id, property, value
+                          in primitives.memo("lowered", lambda graph:
+                                             [(id, property, value.lower())
+                                              for id, property, value
+                                              in primitives.properties()])};
+            edges = {(identities[source], identities[target], label)
+                     for source, target, label in primitives.edges()};
+            attributes = {(identities[source], identities[target], label,
+                           attribute, value)
+                          for source, target, label, attribute, value
+                          in primitives.attributes()};
             return tops, labels, properties, anchors, edges, attributes;
 
-        def count(gold, system, key):
+        def attribute(tuples, natives, key, input):
+            #
+            # map tuples back into node identifiers of the original graph;
+            # edges and attributes start with two node identifiers, all other
+            # tuples with one (or just consist of it, in the case of tops).
+            # exploded anchors (where there is an input string) are reported
+            # as character positions, rather than as intervals.
+            #
+            if key == "tops":
+                return [natives[id] for id in tuples];
+            elif key == "anchors":
+                if input:
+                    return [(natives[id], score.core.positions(anchor))
+                            for id, anchor in tuples];
+                return [(natives[id], list(sorted(anchor)))
+                        for id, anchor in tuples];
+            elif key in {"edges", "attributes"}:
+                return [(natives[item[0]], natives[item[1]]) + item[2:]
+                        for item in tuples];
+            else:
+                return [(natives[item[0]],) + item[1:] for item in tuples];
 
+        def count(gold, system, key = None):
+            #
+            # the set differences are needed for error attribution anyway, and
+            # the number of correct tuples then follows from their size.
+            #
+            missing = gold - system;
             if errors is not None:
-                missing = gold - system;
                 surplus = system - gold;
-                if len(missing) > 0 or len(surplus) > 0 and key not in errors:
+                if len(missing) > 0 or len(surplus) > 0:
                     errors[key] = dict();
-                if key == "tops":
-                    if missing:
-                        errors[key]["missing"] \
-                            = [native(id, identities1) for id in missing];
-                    if surplus:
-                        errors[key]["surplus"] \
-                            = [native(id, identities2) for id in surplus];
-                elif key == "labels":
-                    if missing:
-                        errors[key]["missing"] \
-                            = [(native(id, identities1), label)
-                               for id, label in missing];
-                    if surplus:
-                        errors[key]["surplus"] \
-                            = [(native(id, identities2), label)
-                               for id, label in surplus];
-                elif key == "properties":
-                    if missing:
-                        errors[key]["missing"] \
-                            = [(native(id, identities1), property, value)
-                               for id, property,value in missing];
-                    if surplus:
-                        errors[key]["surplus"] \
-                            = [(native(id, identities2), property, value)
-                               for id, property, value in surplus];
-                elif key == "anchors":
-                    if missing:
-                        errors[key]["missing"] \
-                            = [(native(id, identities1), list(sorted(anchor)))
-                               for id, anchor in missing];
-                    if surplus:
-                        errors[key]["surplus"] \
-                            = [(native(id, identities2), list(sorted(anchor)))
-                               for id, anchor in surplus];
-                elif key == "edges":
-                    if missing:
-                        errors[key]["missing"] \
-                            = [(native(source, identities1),
-                                native(target, identities1), label)
-                               for source, target, label in missing];
-                    if surplus:
-                        errors[key]["surplus"] \
-                               = [(native(source, identities2),
-                                   native(target, identities2), label)
-                                  for source, target, label in surplus];
-                elif key == "attributes":
-                    if missing:
-                        errors[key]["missing"] \
-                            = [(native(source, identities1),
-                                native(target, identities1), label,
-                                attribute, value)
-                               for source, target, label, attribute, value
-                               in missing];
-                    if surplus:
-                        errors[key]["surplus"] \
-                            = [(native(source, identities2),
-                                native(target, identities2), label,
-                                attribute, value)
-                               for source, target, label, attribute, value
-                               in surplus];
-            return {"g": len(gold), "s": len(system), "c": len(gold & system)};
+                if missing:
+                    errors[key]["missing"] \
+                        = attribute(missing, natives1, key, self.input);
+                if surplus:
+                    errors[key]["surplus"] \
+                        = attribute(surplus, natives2, key, graph.input);
+            return {"g": len(gold), "s": len(system),
+                    "c": len(gold) - len(missing)};
 
         if correspondences is None or len(correspondences) == 0:
             return count(set(), set()), count(set(), set()), \
@@ -877,10 +1244,8 @@ class Graph(object):
         if self.framework:
             json["framework"] = self.framework;
         json["version"] = version;
-        if self.time is not None:
-            json["time"] = self.time.strftime("%Y-%m-%d");
-        else:
-            json["time"] = datetime.now().strftime("%Y-%m-%d");
+        json["time"] = stamp(self.time if self.time is not None
+                             else datetime.now());
         if self._language is not None: json["language"] = self._language;
         if self._source is not None: json["source"] = self._source;
         if self._provenance is not None: json["provenance"] = self._provenance;
@@ -892,49 +1257,91 @@ class Graph(object):
             if len(tops):
                 json["tops"] = tops;
             json["nodes"] = [node.encode() for node in self.nodes];
-            if self.edges:
-                json["edges"] = [edge.encode() for edge in
-                                 sorted(self.edges, key = operator.attrgetter("id"))];
+            edges = self.edges;
+            if edges:
+                if not edges.ordered:
+                    edges = sorted(edges, key = operator.attrgetter("id"));
+                json["edges"] = [edge.encode() for edge in edges];
         return json;
 
     @staticmethod
-    def decode(json, robust = False):
-        graph = Graph(json["id"], json.get("flavor"), json.get("framework"))
-        try:
-            graph.time = datetime.strptime(json["time"], "%Y-%m-%d")
-        except:
-            graph.time = datetime.strptime(json["time"], "%Y-%m-%d (%H:%M)")
+    def decode(json, robust = False, lazy = False):
+        graph = (LazyGraph if lazy else Graph)(json["id"], json.get("flavor"),
+                                               json.get("framework"))
+        graph.time = timestamp(json["time"])
         graph.input = json.get("input")
         graph.language(json.get("language"))
         graph.source(json.get("source"))
         graph.provenance(json.get("provenance"))
         graph.targets(json.get("targets"))
+        if lazy:
+            graph._json, graph._robust = json, robust;
+        else:
+            graph._decode_(json, robust);
+        return graph
+
+    def _decode_(self, json, robust = False):
+        #
+        # build nodes directly from their JSON objects, rather than going
+        # through Node.decode() and then add_node(), i.e. creating each twice
+        #
         nodes = json.get("nodes")
         if nodes is not None:
+            index = self._index;
             for j in nodes:
-                node = Node.decode(j)
-                graph.add_node(node.id, node.label, node.properties,
-                               node.values, node.anchors, top = False, anchorings=node.anchorings)
+                get = j.get;
+                node = Node(j["id"], get("label"), get("properties"),
+                            get("values"), get("anchors"),
+                            anchorings = get("anchorings"));
+                self._nodes.append(node);
+                index.setdefault(node.id, node);
         edges = json.get("edges")
         if edges is not None:
             for j in edges:
                 edge = Edge.decode(j);
-                if edge.id is None: edge.id = len(graph.edges);
-                graph.store_edge(edge, robust = robust);
+                if edge.id is None: edge.id = len(self.edges);
+                self.store_edge(edge, robust = robust);
         tops = json.get("tops")
         if tops is not None:
             for i in tops:
-                node = graph.find_node(i)
+                node = self.find_node(i)
                 if node is not None:
                     node.is_top = True
                 else:
                     raise ValueError("Graph.decode(): graph #{}: "
                                      "invalid top node {}."
-                                     "".format(graph.id, i))
-        return graph
+                                     "".format(self.id, i))
 
     def copy(self):
-        return Graph.decode(self.encode())
+        #
+        # a structural copy, rather than a round trip through JSON: nodes and
+        # edges are copied (see Node.copy() and Edge.copy()), and the sets of
+        # incoming and outgoing edges on each node are mirrored from the copied
+        # edges, without looking up nodes or testing edges for equality.
+        #
+        graph = Graph(self.id, self.flavor, self.framework);
+        graph.time = self.time;
+        graph.input = self.input;
+        graph._language = self._language;
+        graph._provenance = self._provenance;
+        graph._source = self._source;
+        graph._targets = self._targets;
+        edges = dict();
+        for edge in self.edges:
+            edges[id(edge)] = copy = edge.copy();
+            graph.edges.add(copy);
+        index = graph._index;
+        for node in self.nodes:
+            copy = node.copy();
+            if node.incoming_edges:
+                copy.incoming_edges = node.incoming_edges.__class__(
+                    edges[id(edge)] for edge in node.incoming_edges);
+            if node.outgoing_edges:
+                copy.outgoing_edges = node.outgoing_edges.__class__(
+                    edges[id(edge)] for edge in node.outgoing_edges);
+            graph._nodes.append(copy);
+            index.setdefault(copy.id, copy);
+        return graph;
 
     def dot(self, stream, ids = False, strings = False,
             errors = None, overlay = False):
@@ -1170,3 +1577,43 @@ class Graph(object):
         # as a finish, sort nodes in graph so that they will again be ordered by id (& realization location)
         graph.nodes = list(sorted(graph.nodes))
         return graph
+
+class LazyGraph(Graph):
+    #
+    # a graph decoded from JSON only as far as its top-level properties, i.e.
+    # nodes and edges are built upon first access; thus, jobs that only look
+    # at, say, identifiers or input strings need not pay for the full graph.
+    # note that errors in the nodes or edges surface only at that point.
+    #
+    def __init__(self, id, flavor = None, framework = None):
+        self._json = None;
+        self._robust = False;
+        super().__init__(id, flavor, framework);
+
+    def _materialize_(self):
+        json, self._json = self._json, None;
+        if json is not None: self._decode_(json, self._robust);
+
+    @property
+    def nodes(self):
+        if self._json is not None: self._materialize_();
+        return self._nodes;
+
+    @nodes.setter
+    def nodes(self, nodes):
+        self._materialize_();
+        Graph.nodes.fset(self, nodes);
+
+    @property
+    def edges(self):
+        if self._json is not None: self._materialize_();
+        return self._edges;
+
+    @edges.setter
+    def edges(self, edges):
+        self._materialize_();
+        self._edges = edges;
+
+    def find_node(self, id):
+        if self._json is not None: self._materialize_();
+        return self._index.get(id);
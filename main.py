@@ -9,9 +9,9 @@ import re;
 import sys;
 import time;
 from pathlib import Path;
-from zipfile import ZipFile;
 
 import codec.amr;
+import codec.binary;
 import codec.conllu;
 import codec.eds;
 import codec.mrp;
@@ -20,7 +20,9 @@ import codec.pmb;
 import codec.sdp;
 import codec.treex;
 import codec.ucca;
+import compressed;
 import inspector;
+import query;
 import score.edm;
 import score.mces;
 import score.sdp;
@@ -36,30 +38,22 @@ NORMALIZATIONS = {"anchors", "case", "edges", "attributes"};
 VALIDATIONS = {"input", "anchors", "edges",
                "amr", "eds", "sdp", "ucca"}
 
-def read_graphs(stream, format = None,
-                full = False, normalize = False, reify = False,
-                frameworks = None, prefix = None, text = None, filter = None,
-                trace = 0, strict = 0, quiet = False, robust = False,
-                alignment = None, anchors = None, pretty = False,
-                id = None, n = None, i = None):
-
-  name = getattr(stream, "name", "");
-  if name.endswith(".zip"):
-    with ZipFile(name) as zip:
-      stream = None;
-      for entry in zip.namelist():
-        if entry.endswith(".mrp"):
-          if stream is not None:
-            print("read_graphs(): multiple MRP entries in ‘{}’; exit."
-                  "".format(name), file = sys.stderr);
-            sys.exit(1);
-          stream = zip.open(entry);
-      if stream is None:
-        print("read_graphs(): missing MRP entry in ‘{}’; exit."
-              "".format(name), file = sys.stderr);
-        sys.exit(1);
+def stream_graphs(stream, format = None,
+                  full = False, normalize = False, reify = False,
+                  frameworks = None, prefix = None, text = None, filter = None,
+                  trace = 0, strict = 0, quiet = False, robust = False,
+                  alignment = None, anchors = None, pretty = False,
+                  id = None, n = None, i = None, cores = 1, lazy = False,
+                  pattern = None):
+
+  #
+  # compressed input (including zip archives of MRP files) is decompressed on
+  # the fly, in a background thread
+  #
+  stream = compressed.reader(stream);
 
   generator = None;
+  normalized = False;
   if format in {"amr", "camr"}:
     generator \
       = codec.amr.read(stream, full = full, reify = reify,
@@ -69,8 +63,50 @@ def read_graphs(stream, format = None,
     generator = codec.sdp.read(stream, framework = format, text = text);
   elif format == "eds":
     generator = codec.eds.read(stream, reify = reify, text = text);
-  elif format == "mrp":
-    generator = codec.mrp.read(stream, text = text, robust = robust);
+  elif format == "mrp" and pattern is not None:
+    #
+    # pattern search uses indices of the MRP file (see query.py), such that
+    # only candidate graphs are decoded
+    #
+    name = getattr(stream, "name", None);
+    if not isinstance(name, str) or not Path(name).is_file():
+      print("read_graphs(): ‘--query’ requires an (uncompressed) MRP file; "
+            "exit.", file = sys.stderr);
+      sys.exit(1);
+    try:
+      labels, edges = query.parse(pattern);
+    except ValueError as error:
+      print("read_graphs(): {}; exit.".format(error), file = sys.stderr);
+      sys.exit(1);
+    generator = query.search(name, labels, edges, robust = robust);
+  elif format in {"binary", "mrp"}:
+    #
+    # where the selection of graphs is not limited by .n., leave it to the
+    # codec, which can seek to the requested graphs (via an index of the file)
+    #
+    selection = dict();
+    if n is None or n < 1:
+      if id is not None:
+        selection["ids"] = {id} if filter is None else {id} & filter;
+      elif filter is not None:
+        selection["ids"] = filter;
+      if frameworks is not None:
+        selection["frameworks"] = frameworks;
+      if id is None and i is not None and i >= 0:
+        selection["position"] = i;
+        i = None;
+    if format == "binary":
+      generator = codec.binary.read(stream, **selection);
+    else:
+      #
+      # leave normalization to the codec, which can batch it with decoding
+      # (across multiple cores), unless graphs need prettifying first
+      #
+      normalized = bool(normalize) and not pretty;
+      generator = codec.mrp.read(stream, text = text, robust = robust,
+                                 cores = cores, lazy = lazy,
+                                 normalize = normalize if normalized else None,
+                                 trace = trace, **selection);
   elif format == "norec":
     generator = codec.norec.read(stream, text = text, reify = reify, strict = strict);
   elif format == "pmb":
@@ -93,43 +129,78 @@ def read_graphs(stream, format = None,
           "".format(format), file = sys.stderr);
     sys.exit(1);
 
-  if generator is None:
-    return None, None;
+  if generator is None: return;
 
   #
-  # (for now) break out of the generators, for downstream simplicity
+  # graphs are filtered and post-processed one at a time, such that a
+  # conversion or validation run need not hold the full corpus in memory
   #
-  graphs = [];
-  overlays = [];
   j = 0;
   while n is None or n < 1 or j < n:
     try:
       graph, overlay = next(generator);
-      if frameworks is not None and graph.framework not in frameworks: continue;
-      if filter is not None and graph.id not in filter: continue;
-      if id is not None:
-        if graph.id == id:
-          graphs.append(graph); overlays.append(overlay);
-      elif i is not None and i >= 0:
-        if j == i:
-          graphs.append(graph); overlays.append(overlay);
-          break;
-      else:
-        graphs.append(graph); overlays.append(overlay);
-      j += 1;
     except StopIteration:
       break;
     except Exception as error:
       print(error, file = sys.stderr);
-      pass;
+      continue;
+    if frameworks is not None and graph.framework not in frameworks: continue;
+    if filter is not None and graph.id not in filter: continue;
+    if id is not None and graph.id != id \
+       or id is None and i is not None and i >= 0 and j != i:
+      j += 1;
+      continue;
+    if pretty: graph.prettify(trace);
+    if normalize and not normalized: graph.normalize(normalize, trace);
+    yield graph, overlay;
+    if id is None and i is not None and i >= 0: break;
+    j += 1;
+
+def read_graphs(stream, **arguments):
+  graphs = [];
+  overlays = [];
+  for graph, overlay in stream_graphs(stream, **arguments):
+    graphs.append(graph); overlays.append(overlay);
+  return graphs, overlays;
 
-  if pretty:
-    for graph in graphs: graph.prettify(trace);
-  if normalize:
-    for graph in graphs: graph.normalize(normalize, trace);
+def write_graph(graph, stream, format, version = 1.1, targets = None,
+                ids = False, strings = False):
+  if format in {"binary", "mrp"}:
+    stream.write(graph);
+  elif format == "evaluation":
+    graph.flavor = graph.framework = graph.nodes = graph.edges = None;
+    if targets is not None:
+      graph.targets(targets.split(","));
+    json.dump(graph.encode(version), stream,
+              indent = None, ensure_ascii = False);
+    print(file = stream);
+  elif format == "dot":
+    graph.dot(stream, ids = ids, strings = strings);
+    print(file = stream);
+  elif format == "tikz":
+    graph.tikz(stream);
+  elif format == "displacy":
+    graph.displacy(stream);
+  elif format == "id":
+    print("{}".format(graph.id), file = stream);
+  elif format == "source":
+    print("{}\t{}".format(graph.id, graph.source()), file = stream);
+  elif format == "targets":
+    for target in graph.targets() or (""):
+      print("{}\t{}".format(graph.id, target), file = stream);
+  elif format == "txt":
+    print("{}\t{}".format(graph.id, graph.input), file = stream);
+  elif format == "ucca":
+    # Prints everything to one long file. To split to separate XML files, use, e.g.,
+    # csplit -zk output.xml '/^<root/' -f '' -b '%02d.xml' {99}
+    codec.ucca.write(graph, graph.input, file = stream)
+
+def write_overlay(overlay, stream, version = 1.1):
+  if overlay:
+    json.dump(overlay.encode(version), stream,
+              indent = None, ensure_ascii = False);
+    print(file = stream);
 
-  return graphs, overlays;
-
 def main():
   parser = argparse.ArgumentParser(description = "MRP Graph Toolkit");
   parser.add_argument("--inspect", action = "store_true");
@@ -138,6 +209,7 @@ def main():
   parser.add_argument("--full", action = "store_true");
   parser.add_argument("--reify", action = "store_true");
   parser.add_argument("--unique", action = "store_true");
+  parser.add_argument("--fingerprint", action = "store_true");
   parser.add_argument("--ids", action = "store_true");
   parser.add_argument("--strings", action = "store_true");
   parser.add_argument("--framework", action = "append", default = []);
@@ -151,6 +223,7 @@ def main():
   parser.add_argument("--score");
   parser.add_argument("--validate", action = "append", default = []);
   parser.add_argument("--limit");
+  parser.add_argument("--search");
   parser.add_argument("--read", required = True);
   parser.add_argument("--write");
   parser.add_argument("--text");
@@ -168,6 +241,7 @@ def main():
   parser.add_argument("--n", type = int);
   parser.add_argument("--id");
   parser.add_argument("--filter");
+  parser.add_argument("--query");
   parser.add_argument("--quiet", action = "store_true");
   parser.add_argument("--robust", action = "store_true");
   parser.add_argument("--trace", "-t", action = "count", default = 0);
@@ -200,7 +274,7 @@ def main():
           file = sys.stderr);
     sys.exit(1);
 
-  if arguments.read not in {"mrp",
+  if arguments.read not in {"mrp", "binary",
                             "ccd", "dm", "pas", "psd", "treex",
                             "eds", "ucca",
                             "amr", "camr", "pmb",
@@ -226,7 +300,7 @@ def main():
 
   if arguments.write is not None and \
      arguments.write not in \
-     {"dot", "tikz", "displacy", "evaluation", "id", "json", "mrp",
+     {"binary", "dot", "tikz", "displacy", "evaluation", "id", "json", "mrp",
       "source", "targets", "txt", "ucca"}:
     print("main.py(): invalid output format: {}; exit."
           "".format(arguments.write), file = sys.stderr);
@@ -242,6 +316,12 @@ def main():
           "".format(arguments.score), file = sys.stderr);
     sys.exit(1);
 
+  if arguments.search is not None and \
+     arguments.search not in {"rrhc", "annealing"}:
+    print("main.py(): invalid search strategy: {}; exit."
+          "".format(arguments.search), file = sys.stderr);
+    sys.exit(1);
+
   if arguments.format and \
      arguments.format not in {"mrp",
                               "ccd", "dm", "pas", "psd",
@@ -266,11 +346,23 @@ def main():
   if arguments.score is not None and len(normalize) == 0:
     normalize = NORMALIZATIONS;
 
+  #
+  # with ‘--fingerprint’, graphs count as duplicates when they are isomorphic
+  # (disregarding node identifiers), rather than when their identifiers match
+  #
+  if arguments.fingerprint: arguments.unique = True;
+
   if arguments.targets == "gather" and not arguments.unique:
     print("main.py(): option ‘--targets gather’ requires ‘--unique’; exit.",
           file = sys.stderr);
     sys.exit(1);
 
+  if arguments.query is not None \
+     and (arguments.read != "mrp" or arguments.text is not None):
+    print("main.py(): option ‘--query’ requires ‘--read mrp’ "
+          "(and no ‘--text’); exit.", file = sys.stderr);
+    sys.exit(1);
+
   if arguments.alignment is not None and arguments.overlay is None:
     print("main.py(): option ‘--alignment’ requires ‘--overlay’; exit.",
           file = sys.stderr);
@@ -280,19 +372,80 @@ def main():
 
   if arguments.cores == 0: arguments.cores = mp.cpu_count();
     
-  graphs, overlays \
-    = read_graphs(arguments.input, format = arguments.read,
-                  full = arguments.full, normalize = normalize,
-                  reify = arguments.reify, frameworks = arguments.framework,
-                  text = text, filter = filter, alignment = arguments.alignment,
-                  anchors = arguments.anchors, pretty = arguments.pretty,
-                  trace = arguments.trace, strict = arguments.strict,
-                  quiet = arguments.quiet, robust = arguments.robust,
-                  id = arguments.id, n = arguments.n, i = arguments.i);
-  if graphs is None:
-    print("main.py(): unable to read input graphs: {}; exit."
-          "".format(arguments.input.name), file = sys.stderr);
-    sys.exit(1);
+  if arguments.validate == ["all"]:
+    actions = VALIDATIONS;
+  else:
+    actions = set();
+    for action in arguments.validate:
+      if action in VALIDATIONS:
+        actions.add(action);
+      else:
+        print("main.py(): invalid type of validation: {}; exit."
+              "".format(action), file = sys.stderr);
+        sys.exit(1);
+
+  #
+  # where only top-level properties of graphs are needed, e.g. when writing
+  # identifiers or input strings, or inspecting, decode MRP graphs lazily
+  #
+  lazy = (arguments.inspect
+          or arguments.write in {"id", "source", "targets", "txt"}) \
+    and not (normalize or actions or arguments.pretty
+             or arguments.analyze or arguments.score);
+
+  pairs = stream_graphs(arguments.input, format = arguments.read,
+                        full = arguments.full, normalize = normalize,
+                        reify = arguments.reify,
+                        frameworks = arguments.framework,
+                        text = text, filter = filter,
+                        alignment = arguments.alignment,
+                        anchors = arguments.anchors, pretty = arguments.pretty,
+                        trace = arguments.trace, strict = arguments.strict,
+                        quiet = arguments.quiet, robust = arguments.robust,
+                        id = arguments.id, n = arguments.n, i = arguments.i,
+                        cores = arguments.cores, lazy = lazy,
+                        pattern = arguments.query);
+
+  arguments.output = compressed.writer(arguments.output);
+  if arguments.overlay:
+    arguments.overlay = compressed.writer(arguments.overlay);
+
+  #
+  # the binary and MRP formats are written through a stateful writer, which
+  # needs to be closed at the end, to output the table of symbols (binary) or
+  # any buffered graphs (MRP)
+  #
+  output = arguments.output;
+  if arguments.write == "binary":
+    output = codec.binary.Writer(arguments.output.buffer);
+  elif arguments.write == "mrp":
+    output = codec.mrp.Writer(arguments.output, arguments.version,
+                              thread = True);
+
+  #
+  # unless the full set of graphs is required (to eliminate duplicates, for
+  # analysis, inspection, or scoring), run each graph through the pipeline
+  # from reading to writing in turn, in constant memory
+  #
+  if not (arguments.unique or arguments.analyze
+          or arguments.inspect or arguments.score):
+    for graph, overlay in pairs:
+      if arguments.source: graph.source(arguments.source);
+      if arguments.inject: graph.inject(arguments.inject);
+      if actions:
+        validate.core.test(graph, actions, stream = sys.stderr);
+      write_graph(graph, output, arguments.write,
+                  version = arguments.version, targets = arguments.targets,
+                  ids = arguments.ids, strings = arguments.strings);
+      if arguments.overlay:
+        write_overlay(overlay, arguments.overlay, arguments.version);
+    if arguments.write in {"binary", "mrp"}: output.close();
+    return;
+
+  graphs = [];
+  overlays = [];
+  for graph, overlay in pairs:
+    graphs.append(graph); overlays.append(overlay);
 
   if arguments.unique:
     targets = dict();
@@ -306,8 +459,9 @@ def main():
     for graph in graphs:
       id = graph.id;
       if id in targets: graph.targets(list(targets[id]));
-      if id not in ids:
-        ids.add(id);
+      key = graph.fingerprint() if arguments.fingerprint else id;
+      if key not in ids:
+        ids.add(key);
         unique.append(graph);
     graphs = unique;
 
@@ -319,18 +473,6 @@ def main():
   if arguments.inject:
     for graph in graphs: graph.inject(arguments.inject);
 
-  if arguments.validate == ["all"]:
-    actions = VALIDATIONS;
-  else:
-    actions = set();
-    for action in arguments.validate:
-      if action in VALIDATIONS:
-        actions.add(action);
-      else:
-        print("main.py(): invalid type of validation: {}; exit."
-              "".format(action), file = sys.stderr);
-        sys.exit(1);
-
   if arguments.quiet: arguments.trace = 0;
 
   if actions:
@@ -350,7 +492,8 @@ def main():
                           text = text, filter = filter,
                           trace = arguments.trace, quiet = arguments.quiet,
                           robust = arguments.robust,
-                          id = arguments.id, n = arguments.n, i = arguments.i);
+                          id = arguments.id, n = arguments.n, i = arguments.i,
+                          cores = arguments.cores, lazy = lazy);
     if gold is None:
       print("main.py(): unable to read gold graphs: {}; exit."
             "".format(arguments.gold.name), file = sys.stderr);
@@ -408,7 +551,10 @@ def main():
                                        values = {"tops", "labels",
                                                  "properties", "anchors",
                                                  "edges", "attributes"},
-                                       trace = arguments.trace);
+                                       search = arguments.search,
+                                       cores = arguments.cores,
+                                       trace = arguments.trace,
+                                       quiet = arguments.quiet);
       elif metric == "ucca":
         result = score.ucca.evaluate(gold, graphs,
                                      format = arguments.write,
@@ -442,41 +588,13 @@ def main():
     sys.exit(0);
       
   for graph in graphs:
-    if arguments.write in {"mrp", "evaluation"}:
-      if arguments.write == "evaluation":
-        graph.flavor = graph.framework = graph.nodes = graph.edges = None;
-        if arguments.targets is not None:
-          graph.targets(arguments.targets.split(","));
-      json.dump(graph.encode(arguments.version), arguments.output,
-                indent = None, ensure_ascii = False);
-      print(file = arguments.output);
-    elif arguments.write == "dot":
-      graph.dot(arguments.output,
+    write_graph(graph, output, arguments.write,
+                version = arguments.version, targets = arguments.targets,
                 ids = arguments.ids, strings = arguments.strings);
-      print(file = arguments.output);
-    elif arguments.write == "tikz":
-      graph.tikz(arguments.output);
-    elif arguments.write == "displacy":
-      graph.displacy(arguments.output);
-    elif arguments.write == "id":
-      print("{}".format(graph.id), file = arguments.output);
-    elif arguments.write == "source":
-      print("{}\t{}".format(graph.id, graph.source()), file = arguments.output);
-    elif arguments.write == "targets":
-      for target in graph.targets() or (""):
-        print("{}\t{}".format(graph.id, target), file = arguments.output);
-    elif arguments.write == "txt":
-      print("{}\t{}".format(graph.id, graph.input), file = arguments.output);
-    elif arguments.write == "ucca":
-      # Prints everything to one long file. To split to separate XML files, use, e.g.,
-      # csplit -zk output.xml '/^<root/' -f '' -b '%02d.xml' {99}
-      codec.ucca.write(graph, graph.input, file = arguments.output)
+  if arguments.write in {"binary", "mrp"}: output.close();
   if arguments.overlay:
     for graph in overlays:
-      if graph:
-        json.dump(graph.encode(arguments.version), arguments.overlay,
-                  indent = None, ensure_ascii = False);
-        print(file = arguments.overlay);
+      write_overlay(graph, arguments.overlay, arguments.version);
     
 if __name__ == "__main__":
   main();
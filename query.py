@@ -0,0 +1,248 @@
+import json;
+import os;
+import re;
+import sys;
+
+import codec.mrp;
+from graph import Graph;
+
+#
+# graph pattern search over an MRP corpus: inverted indices from node labels
+# and from (source label, edge label, target label) triples to the graphs in
+# which they occur narrow down the candidates for a pattern, which are then
+# verified against the full graph.  the indices are stored in a sidecar file,
+# next to the one for codec.mrp.index(), and rebuilt whenever the MRP file has
+# changed since.
+#
+VERSION = 2;
+
+#
+# a pattern is a sequence of paths, separated by semicolons; a path is a
+# sequence of nodes, separated by (whitespace and) edges, either ‘-label->’ or
+# ‘<-label-’.  a node is either a label, or ‘variable:label’, where all nodes
+# with the same variable denote the same node in the graph.  an empty label,
+# or ‘*’, matches any label (of nodes or edges); distinct variables (as well as
+# nodes without a variable) match distinct nodes.  for example:
+#
+#   _dog_n_1
+#   _the_q -BV-> _dog_n_1
+#   x:_chase_v_1 -ARG1-> _dog_n_1; x: -ARG2-> _cat_n_1
+#
+FORWARD = re.compile(r"^-(.*)->$");
+BACKWARD = re.compile(r"^<-(.*)-$");
+
+def string(value):
+  return value if isinstance(value, str) else None;
+
+def label(string):
+  return None if string in {"", "*"} else string;
+
+def parse(pattern):
+  variables = dict();
+  labels = [];
+  edges = [];
+  def node(token):
+    if ":" in token:
+      name, value = token.split(":", maxsplit = 1);
+    else:
+      name, value = "", token;
+    value = label(value);
+    if name == "" or name not in variables:
+      i = len(labels);
+      labels.append(value);
+      if name != "": variables[name] = i;
+    else:
+      i = variables[name];
+      if labels[i] is None: labels[i] = value;
+      elif value is not None and value != labels[i]:
+        raise ValueError("query.parse(): conflicting labels for ‘{}’: "
+                         "‘{}’ vs. ‘{}’".format(name, labels[i], value));
+    return i;
+
+  for path in pattern.split(";"):
+    tokens = path.split();
+    if len(tokens) == 0: continue;
+    if len(tokens) % 2 == 0:
+      raise ValueError("query.parse(): invalid path ‘{}’"
+                       "".format(path.strip()));
+    source = node(tokens[0]);
+    for k in range(1, len(tokens), 2):
+      target = node(tokens[k + 1]);
+      match = FORWARD.match(tokens[k]);
+      if match is not None:
+        edges.append((source, label(match.group(1)), target));
+      else:
+        match = BACKWARD.match(tokens[k]);
+        if match is None:
+          raise ValueError("query.parse(): invalid edge ‘{}’"
+                           "".format(tokens[k]));
+        edges.append((target, label(match.group(1)), source));
+      source = target;
+  if len(labels) == 0:
+    raise ValueError("query.parse(): empty pattern");
+  return labels, edges;
+
+class Index(object):
+
+  def __init__(self, entries, labels, triples):
+    self.entries = entries;
+    self.labels = labels;
+    self.triples = triples;
+
+  @staticmethod
+  def build(name, entries):
+    labels = dict();
+    triples = dict();
+    with open(name, "rb") as stream:
+      for j, (_, _, offset, length) in enumerate(entries):
+        stream.seek(offset);
+        try:
+          graph = codec.mrp.loads(stream.read(length));
+        except:
+          continue;
+        #
+        # patterns only ever match string labels, and only these survive a
+        # round trip through the JSON sidecar as keys; other labels are
+        # indexed as unknown (None), which only wildcards match.
+        #
+        nodes = dict();
+        for node in graph.get("nodes") or ():
+          value = string(node.get("label"));
+          nodes[node.get("id")] = value;
+          if value is not None: labels.setdefault(value, set()).add(j);
+        for edge in graph.get("edges") or ():
+          key = (nodes.get(edge.get("source")), string(edge.get("label")),
+                 nodes.get(edge.get("target")));
+          triples.setdefault(key, set()).add(j);
+    return Index(entries,
+                 {key: sorted(value) for key, value in labels.items()},
+                 {key: sorted(value) for key, value in triples.items()});
+
+  @staticmethod
+  def load(name):
+    #
+    # indices are (re)built as needed, along with the index of graph offsets
+    #
+    entries = codec.mrp.index(name);
+    path = name + ".qdx";
+    status = os.stat(name);
+    header = {"version": VERSION,
+              "size": status.st_size, "mtime": status.st_mtime_ns};
+    if os.path.isfile(path):
+      try:
+        with open(path, encoding = "utf-8") as stream:
+          if json.loads(stream.readline()) \
+             == dict(header, count = len(entries)):
+            labels = codec.mrp.loads(stream.readline());
+            triples = {(source, label, target): postings
+                       for source, label, target, postings
+                       in codec.mrp.loads(stream.readline())};
+            return Index(entries, labels, triples);
+      except:
+        pass;
+    index = Index.build(name, entries);
+    header["count"] = len(entries);
+    try:
+      codec.mrp.save(path,
+                     [json.dumps(header),
+                      json.dumps(index.labels, ensure_ascii = False),
+                      json.dumps([list(key) + [postings]
+                                  for key, postings in index.triples.items()],
+                                 ensure_ascii = False)]);
+    except:
+      pass;
+    return index;
+
+  def candidates(self, labels, edges):
+    #
+    # the intersection of postings for all labelled nodes and all edges of the
+    # pattern; edges with some unspecified label (or labels) take the union of
+    # postings for all matching triples.
+    #
+    postings = [];
+    for value in labels:
+      if value is not None: postings.append(self.labels.get(value, ()));
+    for source, value, target in edges:
+      key = (labels[source], value, labels[target]);
+      if None not in key:
+        postings.append(self.triples.get(key, ()));
+      elif key != (None, None, None):
+        union = set();
+        for triple, positions in self.triples.items():
+          if all(x is None or x == y for x, y in zip(key, triple)):
+            union.update(positions);
+        postings.append(union);
+    if len(postings) == 0: return range(len(self.entries));
+    postings.sort(key = len);
+    result = set(postings[0]);
+    for positions in postings[1:]:
+      if len(result) == 0: break;
+      result.intersection_update(positions);
+    return sorted(result);
+
+def match(graph, labels, edges):
+  #
+  # find an injective assignment of graph nodes to pattern nodes, such that
+  # labels and edges match; pattern nodes are assigned in order of decreasing
+  # number of edges, and candidates checked against all edges so far.
+  #
+  nodes = dict();
+  for node in graph.nodes:
+    nodes.setdefault(string(node.label), []).append(node.id);
+  triples = set();
+  pairs = set();
+  for edge in graph.edges:
+    triples.add((edge.src, string(edge.lab), edge.tgt));
+    pairs.add((edge.src, edge.tgt));
+  everything = [node.id for node in graph.nodes];
+  degrees = [0] * len(labels);
+  for source, _, target in edges:
+    degrees[source] += 1; degrees[target] += 1;
+  order = sorted(range(len(labels)), key = lambda i: -degrees[i]);
+  assignment = [None] * len(labels);
+  used = set();
+
+  def consistent(i, id):
+    for source, value, target in edges:
+      if source != i and target != i: continue;
+      s = id if source == i else assignment[source];
+      t = id if target == i else assignment[target];
+      if s is None or t is None: continue;
+      if value is None:
+        if (s, t) not in pairs: return False;
+      elif (s, value, t) not in triples: return False;
+    return True;
+
+  def search(k):
+    if k == len(order): return True;
+    i = order[k];
+    for id in (nodes.get(labels[i], ()) if labels[i] is not None
+               else everything):
+      if id not in used and consistent(i, id):
+        assignment[i] = id;
+        used.add(id);
+        if search(k + 1): return True;
+        used.discard(id);
+        assignment[i] = None;
+    return False;
+
+  return search(0);
+
+def search(name, labels, edges, robust = False):
+  #
+  # yield (graph, None) pairs for all graphs that match the pattern given by
+  # .labels. and .edges. (as returned by parse()), in order
+  #
+  index = Index.load(name);
+  with open(name, "rb") as stream:
+    for j in index.candidates(labels, edges):
+      _, _, offset, length = index.entries[j];
+      stream.seek(offset);
+      try:
+        graph = Graph.decode(codec.mrp.loads(stream.read(length)),
+                             robust = robust);
+      except Exception as error:
+        print("query.search(): ignoring line {}: {}"
+              "".format(j, error), file = sys.stderr);
+        continue;
+      if match(graph, labels, edges): yield graph, None;
@@ -1,3 +1,5 @@
+from functools import lru_cache;
+import re;
 import sys;
 
 #
@@ -7,6 +9,8 @@ import sys;
 #
 PUNCTUATION = frozenset(".?!;,:“\"”‘'’()[]{} \t\n\f")
 SPACE = frozenset(" \t\n\f")
+WORDS = re.compile(r"[^ \t\n\f]+");
+SPACES = re.compile(r"[ \t\n\f]");
 
 def intersect(golds, systems, quiet = False):
   golds = {(graph.language(), graph.framework, graph.id): graph
@@ -56,7 +60,14 @@ def anchor(node):
   return result;
 
 def explode(string, anchors, trim = PUNCTUATION):
-  result = set();
+  #
+  # the canonical form of a set of anchors: the sorted, maximal intervals of
+  # (non-whitespace) characters covered, after trimming punctuation from both
+  # ends of each anchor.  two sets of anchors cover the same characters if and
+  # only if their intervals are equal, hence these can be compared (or hashed)
+  # just like the sets of character positions they stand for.
+  #
+  spans = [];
   for anchor in anchors:
     start = end = None;
     if isinstance(anchor, tuple):
@@ -64,15 +75,48 @@ def explode(string, anchors, trim = PUNCTUATION):
     elif "from" in anchor and "to" in anchor:
       start = anchor["from"]; end = anchor["to"];
     if start is not None and end is not None:
-      while start < end and string[start] in trim:
-        start += 1;
-      while end > start and string[end - 1] in trim:
-        end -= 1;
-      for i in range(start, end):
-        if string[i] not in SPACE:
-          result.add(i);
-  return frozenset(result);
-
+      spans.append((start, end));
+  return intervals(string, tuple(spans), trim);
+
+@lru_cache(maxsize = 1 << 16)
+def intervals(string, spans, trim = PUNCTUATION):
+  runs = [];
+  for start, end in spans:
+    while start < end and string[start] in trim:
+      start += 1;
+    while end > start and string[end - 1] in trim:
+      end -= 1;
+    if start < end:
+      if SPACES.search(string, start, end) is None:
+        runs.append((start, end));
+      else:
+        runs.extend(match.span()
+                    for match in WORDS.finditer(string, start, end));
+  runs.sort();
+  result = [];
+  for start, end in runs:
+    if result and start <= result[-1][1]:
+      if end > result[-1][1]: result[-1] = (result[-1][0], end);
+    else:
+      result.append((start, end));
+  return tuple(result);
+
+def overlap(first, second):
+  #
+  # the number of characters shared by two sets of intervals (from explode())
+  #
+  result = i = j = 0;
+  while i < len(first) and j < len(second):
+    start = max(first[i][0], second[j][0]);
+    end = min(first[i][1], second[j][1]);
+    if start < end: result += end - start;
+    if first[i][1] < second[j][1]: i += 1;
+    else: j += 1;
+  return result;
+
+def positions(intervals):
+  return [i for start, end in intervals for i in range(start, end)];
+
 def fscore(gold, system, correct):
   p = correct / system if system else 0.0;
   r = correct / gold if gold else 0.0;
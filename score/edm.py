@@ -4,27 +4,21 @@ from graph import Graph;
 import score.core;
 
 def tuples(graph, explode = False):
-  identities = dict();
+  primitives = graph.primitives();
+  if graph.input and explode: identities = primitives.exploded();
+  else: identities = primitives.anchors();
   names = set();
   tops = set();
-  arguments = set();
-  properties = set();
   for node in graph.nodes:
-    if graph.input and explode:
-      identity = score.core.explode(graph.input,
-                                    score.core.anchor(node));
-    else:
-      identity = tuple(score.core.anchor(node));
-    identities[node.id] = identity;
+    identity = identities[node.id];
     if node.label is not None: names.add((identity, node.label));
     if node.is_top: tops.add(identity);
-    if node.properties and node.values:
-      for property, value in zip(node.properties, node.values):
-        properties.add((identity, property, value))
-  for edge in graph.edges:
-    arguments.add((identities[edge.src], identities[edge.tgt], edge.lab));
+  properties = {(identities[id], property, value)
+                for id, property, value in primitives.properties()};
+  arguments = {(identities[source], identities[target], label)
+               for source, target, label in primitives.edges()};
   return names, arguments, properties, tops;
-
+
 def evaluate(golds, systems, format = "json", trace = 0):
   tgn = tsn = tcn = 0;
   tga = tsa = tca = 0;
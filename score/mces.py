@@ -5,20 +5,25 @@ from operator import itemgetter
 import numpy as np
 
 import score.core
+from graph import SYMBOLS
 from score.smatch import smatch
-from score.ucca import identify
+from score.ucca import yields
 
 counter = 0
 
 def reindex(i):
     return -2 - i
 
-def get_or_update(index, key):
-    return index.setdefault(key, len(index))
+def get_or_update(key):
+    #
+    # pseudo-nodes are identified by the session-wide symbol identifier of
+    # their key, which is the same for both graphs being compared
+    #
+    return SYMBOLS.id(key)
 
 class InternalGraph():
 
-    def __init__(self, graph, index):
+    def __init__(self, graph):
         self.node2id = dict()
         self.id2node = dict()
         self.nodes = []
@@ -27,11 +32,10 @@ class InternalGraph():
             self.node2id[node] = i
             self.id2node[i] = node
             self.nodes.append(i)
+        compact = graph.compact()
         for edge in graph.edges:
-            src = graph.find_node(edge.src)
-            src = self.node2id[src]
-            tgt = graph.find_node(edge.tgt)
-            tgt = self.node2id[tgt]
+            src = compact.index[edge.src]
+            tgt = compact.index[edge.tgt]
             self.edges.append((src, tgt, edge.lab))
             if edge.attributes:
                 for prop, val in zip(edge.attributes, edge.values):
@@ -40,29 +44,23 @@ class InternalGraph():
         # Build the pseudo-edges. These have target nodes that are
         # unique for the value of the label, anchor, property.
         #
-        if index is None:
-            index = dict()
+        exploded = graph.primitives().exploded()
         for i, node in enumerate(graph.nodes):
             # labels
-            j = get_or_update(index, ("L", node.label))
+            j = get_or_update(("L", node.label))
             self.edges.append((i, reindex(j), None))
             # tops
             if node.is_top:
-                j = get_or_update(index, ("T"))
+                j = get_or_update(("T"))
                 self.edges.append((i, reindex(j), None))
             # anchors
             if node.anchors is not None:
-                anchor = score.core.anchor(node);
-                if graph.input:
-                    anchor = score.core.explode(graph.input, anchor);
-                else:
-                    anchor = tuple(anchor);
-                j = get_or_update(index, ("A", anchor))
+                j = get_or_update(("A", exploded[node.id]))
                 self.edges.append((i, reindex(j), None))
             # properties
             if node.properties:
                 for prop, val in zip(node.properties, node.values):
-                    j = get_or_update(index, ("P", prop, val))
+                    j = get_or_update(("P", prop, val))
                     self.edges.append((i, reindex(j), None))
 
 def initial_node_correspondences(graph1, graph2,
@@ -101,11 +99,12 @@ def initial_node_correspondences(graph1, graph2,
                 edges[i, j] += sum(src_edges_x) + sum(tgt_edges_x)
 
                 #
-                # and the overlap of UCCA yields (sets of character position)
+                # and the overlap of UCCA yields (intervals of character
+                # positions)
                 #
                 if identities1 and identities2:
-                    anchors[i, j] += len(identities1[node1.id] &
-                                         identities2[node2.id])
+                    anchors[i, j] += score.core.overlap(identities1[node1.id],
+                                                        identities2[node2.id])
             if queue is not None:
                 queue.append((rewards[i, j], edges[i, j], anchors[i, j],
                               i, j if node2 is not None else None));
@@ -257,20 +256,8 @@ def identities(g, s):
     #
     if g.framework == "ucca" and g.input \
             and s.framework == "ucca" and s.input:
-        g_identities = dict()
-        s_identities = dict()
-        g_dominated = dict()
-        s_dominated = dict()
-        for node in g.nodes:
-            g_identities, g_dominated = \
-                identify(g, node.id, g_identities, g_dominated)
-        g_identities = {key: score.core.explode(g.input, value)
-                        for key, value in g_identities.items()}
-        for node in s.nodes:
-            s_identities, s_dominated = \
-                identify(s, node.id, s_identities, s_dominated)
-        s_identities = {key: score.core.explode(s.input, value)
-                        for key, value in s_identities.items()}
+        g_identities, g_dominated = yields(g)
+        s_identities, s_dominated = yields(s)
     else:
         g_identities = s_identities = g_dominated = s_dominated = None
     return g_identities, s_identities, g_dominated, s_dominated
@@ -296,9 +283,8 @@ def domination_conflict(graph1, graph2, cv, i, j, dominated1, dominated2):
 def correspondences(graph1, graph2, pairs, rewards, limit=None, trace=0,
                     dominated1=None, dominated2=None, bilexical = False):
     global counter
-    index = dict()
-    graph1 = InternalGraph(graph1, index)
-    graph2 = InternalGraph(graph2, index)
+    graph1 = InternalGraph(graph1)
+    graph2 = InternalGraph(graph2)
     cv = dict()
     ce = make_edge_candidates(graph1, graph2)
     # Visit the source graph nodes in descending order of rewards.
@@ -352,10 +338,50 @@ def is_injective(correspondence):
                 seen.add(x)
     return True
 
+def isomorphism(g, s):
+    #
+    # for graphs with the same fingerprint, pair nodes by their (final) colour
+    # in Weisfeiler-Lehman refinement, in order among nodes of the same colour,
+    # and return the scores if that pairing indeed matches all tuples.
+    #
+    if not g.nodes or not s.nodes or len(g.nodes) != len(s.nodes) \
+       or g.fingerprint() != s.fingerprint():
+        return None
+    _, gcolors = g.primitives().refinement()
+    _, scolors = s.primitives().refinement()
+    classes = dict()
+    for j, color in enumerate(scolors):
+        classes.setdefault(color, []).append(j)
+    pairs = []
+    for i, color in enumerate(gcolors):
+        if not classes.get(color): return None
+        pairs.append((i, classes[color].pop(0)))
+    counts = g.score(s, pairs)
+    if all(count["g"] == count["s"] == count["c"] for count in counts):
+        return pairs, counts
+    return None
+
 def schedule(g, s, rrhc_limit, mces_limit, trace, errors):
     global counter;
     try:
         counter = 0;
+        #
+        # graphs that are identical (up to node identifiers and order) need no
+        # search: all tuples match, under the pairing of nodes by colour
+        #
+        match = isomorphism(g, s)
+        if match is not None:
+            pairs, counts = match
+            if errors is not None:
+                if g.framework not in errors: errors[g.framework] = dict();
+                counts = g.score(s, pairs, errors);
+            tops, labels, properties, anchors, edges, attributes = counts;
+            if trace > 1:
+                print("\n\ngraph #{} ({}; {}; {}): isomorphic"
+                      "".format(g.id, g.language(), g.flavor, g.framework),
+                      file = sys.stderr);
+            return g.id, g, s, tops, labels, properties, anchors, \
+                edges, attributes, 0, 0, None;
         g_identities, s_identities, g_dominated, s_dominated \
             = identities(g, s);
         bilexical = g.flavor == 0 or g.framework in {"dm", "psd", "pas", "ccd"};
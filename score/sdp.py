@@ -2,7 +2,7 @@
 
 import sys
 
-from score.core import anchor, intersect;
+from score.core import intersect;
 
 class Measure(object):
 
@@ -120,8 +120,8 @@ class Scorer(object):
     #     report_predications(self.complete_predications(g))
 
     def update(self, g, s, trace):
-        gidentities = {node.id: tuple(anchor(node)) for node in g.nodes}
-        sidentities = {node.id: tuple(anchor(node)) for node in s.nodes}
+        gidentities = g.primitives().anchors()
+        sidentities = s.primitives().anchors()
         scores = dict();
         for key, measure in self.measures:
             score = measure.update(g, s, gidentities, sidentities, trace)
@@ -1,58 +1,73 @@
+import multiprocessing as mp;
 import sys;
 
 import score.core;
-from smatch.smatch import get_amr_match;
+import smatch.smatch as rrhc;
+from graph import SYMBOLS;
+from smatch.smatch import get_id_match;
 
+def intern(value):
+  #
+  # map (normalized) strings, or any other hashable value, to their integer
+  # identifier in the session-wide table of symbols
+  #
+  if isinstance(value, str): value = rrhc.normalize(value);
+  return SYMBOLS.id(value);
+
 def tuples(graph, prefix, values, faith = True):
   #
-  # mimicry of get_triples() in amr.py
+  # mimicry of get_triples() in amr.py, except that nodes are represented by
+  # their index into the .nodes. list, and all other triple components by
+  # their interned symbol identifier.
   #
-  id = 0;
   mapping = dict();
   instances = [];
   relations = [];
   attributes = [];
   n = 0;
-  for node in graph.nodes:
-    mapping[node.id] = name = prefix + str(id);
-    id += 1;
+  instance = intern("instance");
+  anchor = intern("anchor");
+  top = intern("TOP");
+  exploded = graph.primitives().exploded();
+  for i, node in enumerate(graph.nodes):
+    mapping[node.id] = i;
+  for i, node in enumerate(graph.nodes):
     if "anchors" in values and node.anchors is not None:
-      anchor = score.core.anchor(node);
-      if graph.input: anchor = score.core.explode(graph.input, anchor);
-      attributes.append(("anchor", name, str(anchor)));
+      attributes.append((anchor, i, intern(exploded[node.id])));
     if "labels" in values and node.label is not None:
-      instance = node.label;
+      label = node.label;
     else:
-      instance = "__()_{}__".format(prefix, n);
+      label = "__()_{}__".format(prefix, n);
       n += 1;
-    instances.append(("instance", name, instance));
+    instances.append((instance, i, intern(label)));
     if "tops" in values and node.is_top:
       #
       # the native SMATCH code (wrongly, i believe) ties the top property to
       # the node label (see https://github.com/cfmrp/mtool/issues/12).  we get
       # to choose whether to faithfully replicate those scores or not.
       #
-      attributes.append(("TOP", name,
-                         node.label if node.label and faith else ""));
+      attributes.append((top, i,
+                         intern(node.label if node.label and faith else "")));
     if "properties" in values and node.properties and node.values:
       for property, value in zip(node.properties, node.values):
-        attributes.append((property, name, value));
+        attributes.append((intern(property), i, intern(value)));
   for edge in graph.edges:
     if "edges" in values:
-      relations.append((edge.lab, mapping[edge.src], mapping[edge.tgt]));
+      relations.append((intern(edge.lab),
+                        mapping[edge.src], mapping[edge.tgt]));
     if "attributes" in values:
       if edge.attributes and edge.values:
         for attribute, value in zip(edge.attributes, edge.values):
-          relations.append((str((attribute, value)),
+          relations.append((intern(str((attribute, value))),
                             mapping[edge.src], mapping[edge.tgt]));
   return instances, attributes, relations, n;
-
-def smatch(gold, system, limit = 20, values = {}, trace = 0, faith = True):
-  gprefix = "g"; sprefix = "s";
+
+def smatch(gold, system, limit = 20, values = {}, trace = 0, faith = True,
+           search = None):
   ginstances, gattributes, grelations, gn \
-    = tuples(gold, gprefix, values, faith);
+    = tuples(gold, "g", values, faith);
   sinstances, sattributes, srelations, sn \
-    = tuples(system, sprefix, values, faith);
+    = tuples(system, "s", values, faith);
   if trace > 1:
     print("gold instances [{}]: {}\ngold attributes [{}]: {}\n"
           "gold relations [{}]: {}"
@@ -67,35 +82,70 @@ def smatch(gold, system, limit = 20, values = {}, trace = 0, faith = True):
                     len(srelations), srelations),
           file = sys.stderr);
   correct, gold, system, mapping \
-    = get_amr_match(None, None, gold.id, limit = limit,
-                    instance1 = ginstances, attributes1 = gattributes,
-                    relation1 = grelations, prefix1 = gprefix,
-                    instance2 = sinstances, attributes2 = sattributes,
-                    relation2 = srelations, prefix2 = sprefix);
+    = get_id_match(ginstances, gattributes, grelations,
+                   sinstances, sattributes, srelations,
+                   limit = limit, search = search);
   return correct, gold - gn, system - sn, mapping;
-
+
+def schedule(gold, system, limit, values, search, trace):
+  id = gold.id;
+  correct, gold, system, _ \
+    = smatch(gold, system, limit, values, trace, search = search);
+  return id, correct, gold, system, rrhc.saved_iteration_num;
+
+def unpack(arguments):
+  return schedule(*arguments);
+
 def evaluate(golds, systems, format = "json", limit = 20,
-             values = {}, trace = 0):
+             values = {}, search = None, cores = 0, trace = 0, quiet = False):
   if limit is None or not limit > 0: limit = 20;
-  if trace > 1: print("RRHC limit: {}".format(limit), file = sys.stderr);
+  if search is None: search = "rrhc";
+  if search not in rrhc.search_strategies:
+    raise ValueError("smatch.evaluate(): invalid search strategy: {}"
+                     "".format(search));
+  if trace > 1:
+    print("{} limit: {}".format(search.upper(), limit), file = sys.stderr);
   tg = ts = tc = n = 0;
+  saved = 0;
   scores = dict() if trace else None;
-  for gold, system in score.core.intersect(golds, systems):
-    id = gold.id;
-    correct, gold, system, mapping \
-      = smatch(gold, system, limit, values, trace);
+  pairs = ((gold, system, limit, values, search, trace)
+           for gold, system
+           in score.core.intersect(golds, systems, quiet = quiet));
+  pool = None;
+  if cores > 1:
+    if trace > 1:
+      print("smatch.evaluate(): using {} cores".format(cores),
+            file = sys.stderr);
+    #
+    # results arrive in input order but are aggregated as they come in, so
+    # per-pair outcomes need not be held in memory all at once
+    #
+    pool = mp.Pool(cores);
+    results = pool.imap(unpack, pairs);
+  else:
+    results = (schedule(*arguments) for arguments in pairs);
+
+  for id, correct, gold, system, restarts in results:
     tg += gold; ts += system; tc += correct;
+    saved += restarts;
     n += 1;
     if trace:
       if id in scores:
         print("smatch.evaluate(): duplicate graph identifier: {}"
               "".format(id), file = sys.stderr);
-      scores[id] = {"g": gold, "s": system, "c": correct};
+      scores[id] = {"g": gold, "s": system, "c": correct, "saved": restarts};
       if trace > 1:
         p, r, f = score.core.fscore(gold, system, correct);
-        print("G: {}; S: {}; C: {}; P: {}; R: {}; F: {}"
-              "".format(gold, system, correct, p, r, f), file = sys.stderr);
-    
+        print("G: {}; S: {}; C: {}; P: {}; R: {}; F: {}; saved: {}"
+              "".format(gold, system, correct, p, r, f, restarts),
+              file = sys.stderr);
+  if pool is not None:
+    pool.close();
+    pool.join();
+
+  if trace:
+    print("smatch.evaluate(): {} of {} {} restarts saved by upper bound"
+          "".format(saved, n * limit, search.upper()), file = sys.stderr);
   p, r, f = score.core.fscore(tg, ts, tc);
   result = {"n": n, "g": tg, "s": ts, "c": tc, "p": p, "r": r, "f": f};
   if trace: result["scores"] = scores;
@@ -20,29 +20,43 @@ def identify(graph, node, anchors = None, dominated = None, recursion = False):
   elif node in anchors:
     return anchors, dominated;
   anchors[node] = node_anchors = anchor(graph.find_node(node));
-  for edge in graph.edges:
+  #
+  # rather than scanning all edges, visit the outgoing edges of .node. only
+  #
+  compact = graph.compact();
+  for i in compact.outgoing(compact.index[node]):
+    edge = compact.edges[i];
     if edge.attributes is None or "remote" not in edge.attributes:
-      if node == edge.src:
-        identify(graph, edge.tgt, anchors, dominated, True);
-        for leaf in anchors[edge.tgt]:
-          if leaf not in node_anchors: node_anchors.append(leaf);
-        node_dominated.add(edge.tgt)
-        node_dominated |= dominated[edge.tgt]
+      identify(graph, edge.tgt, anchors, dominated, True);
+      for leaf in anchors[edge.tgt]:
+        if leaf not in node_anchors: node_anchors.append(leaf);
+      node_dominated.add(edge.tgt)
+      node_dominated |= dominated[edge.tgt]
   if not recursion:
       anchors = {key: tuple(sorted(value, key = itemgetter(0, 1)))
                  for key, value in anchors.items()}
   return anchors, dominated;
 
-def tuples(graph):
-  identities = dict();
-  for node in graph.nodes:
-    identities, _ = identify(graph, node.id, identities);
+def yields(graph):
   #
-  # for robust comparison, represent each yield as a character set
+  # the UCCA yield of each node and the nodes it dominates, for all nodes; for
+  # robust comparison, represent each yield as a character set (where there is
+  # an input string).  yields are cached with the graph, for reuse across the
+  # UCCA scorer proper and initialization of the MRP search.
   #
-  if graph.input:
-    for id in identities:
-      identities[id] = explode(graph.input, identities[id]);
+  def compute(graph):
+    identities = dict();
+    dominated = dict();
+    for node in graph.nodes:
+      identities, dominated = identify(graph, node.id, identities, dominated);
+    if graph.input:
+      identities = {id: explode(graph.input, value)
+                    for id, value in identities.items()};
+    return identities, dominated;
+  return graph.primitives().memo("ucca", compute);
+
+def tuples(graph):
+  identities, _ = yields(graph);
   lprimary = set();
   lremote = set();
   uprimary = set();
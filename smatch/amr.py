@@ -9,6 +9,7 @@ For detailed description of AMR, see http://www.isi.edu/natural-language/amr/a.p
 
 from __future__ import print_function
 from collections import defaultdict
+import re
 import sys
 
 # change this if needed
@@ -17,6 +18,112 @@ ERROR_LOG = sys.stderr
 # change this if needed
 DEBUG_LOG = sys.stderr
 
+# the one-line AMR form as a sequence of (possibly empty) character sequences, each followed by a significant
+# symbol (or the end of the line); symbols inside (possibly unterminated) quotes are not significant.
+TOKENS = re.compile(r'([^()/:"]*(?:"[^"]*"?[^()/:"]*)*)([()/:]|$)')
+
+
+def build(line):
+    """
+    Build an AMR directly from the tokens of a well-formed one-line AMR, with exactly the result of the general
+    parser; returns None where the line is not well-formed (including quotes that contain whitespace or significant
+    symbols), or would be rejected by the general parser.
+
+    """
+    # the general parser preserves whitespace other than spaces, which (like any other unprintable characters) is
+    # left to it; so are quotes that contain whitespace or significant symbols, or that are not separated from other
+    # tokens, i.e. any tokens that contain quotes other than at both ends.
+    if not line.isprintable():
+        return None
+    tokens = line.replace("(", " ( ").replace(")", " ) ").replace("/", " / ").replace(":", " :").split()
+    if len(tokens) < 4 or tokens[0] != "(":
+        return None
+    if "\"" in line:
+        for token in [token for token in tokens if "\"" in token]:
+            if len(token) < 2 or token[0] != "\"" or token[-1] != "\"" or token.count("\"") != 2:
+                return None
+    # node names, in order of occurrence, and their values; each node has a list of relations to other nodes, and
+    # of values that may turn out to be either nodes or constants (once all node names are known).
+    node_name_list = []
+    node_value_list = []
+    index = {}
+    relations = []
+    pending = []
+    stack = []
+    node_relations = node_pending = None
+    relation_name = None
+    it = iter(tokens)
+    for token in it:
+        if token[0] == ":":
+            value = next(it, ")")
+            if value != "(":
+                if token == ":" or node_relations is None or value[0] in ":()/":
+                    return None
+                if value[0] == "\"":
+                    value = value[1:-1] + "¦"
+                # values that are names of nodes seen so far are relations right away; any others are resolved
+                # after all nodes are known, and follow those in the list of relations
+                if value in index:
+                    node_relations.append([token[1:], value])
+                else:
+                    node_pending.append((token[1:], value))
+                continue
+            # a node, other than the top one, has to be the value of a relation
+            if token == ":" or node_relations is None:
+                return None
+            relation_name = token[1:]
+            token = value
+        if token == "(":
+            node_name = next(it, "/")
+            if next(it, None) != "/":
+                return None
+            node_value = next(it, "/")
+            if node_name[0] in ":\"()/" or node_value[0] in ":()/" or node_name in index:
+                return None
+            if relation_name is not None:
+                node_relations.append([relation_name, node_name])
+                relation_name = None
+            elif node_name_list:
+                return None
+            if node_value[0] == "\"":
+                node_value = node_value[1:-1] + "¦"
+            index[node_name] = len(node_name_list)
+            node_name_list.append(node_name)
+            node_value_list.append(node_value)
+            stack.append((node_relations, node_pending))
+            node_relations = []
+            node_pending = []
+            relations.append(node_relations)
+            pending.append(node_pending)
+        elif token == ")" and node_relations is not None:
+            node_relations, node_pending = stack.pop()
+        else:
+            return None
+    if node_relations is not None:
+        return None
+    relation_list = []
+    attribute_list = []
+    for node_relations, node_pending in zip(relations, pending):
+        node_attributes = []
+        for name, value in node_pending:
+            if value in index:
+                node_relations.append([name, value])
+            else:
+                node_attributes.append([name, value])
+        relation_list.append(node_relations)
+        attribute_list.append(node_attributes)
+    # add TOP as an attribute. The attribute value is the top node value
+    attribute_list[0].append(["TOP", node_value_list[0]])
+    return AMR(node_name_list, node_value_list, relation_list, attribute_list)
+
+
+def position(tokens, k):
+    """
+    Character offset of the kth significant symbol (only needed in error messages).
+
+    """
+    return sum(len(segment) + len(c) for segment, c in tokens[:k + 1]) - 1
+
 
 class AMR(object):
     """
@@ -193,21 +300,25 @@ class AMR(object):
     def parse_AMR_line(line):
         """
         Parse a AMR from line representation to an AMR object.
-        This parsing algorithm scans the line once and process each character, in a shift-reduce style.
+        Well-formed lines are built directly (see build()); otherwise, this parsing algorithm scans the line once,
+        from one significant symbol to the next (see TOKENS), in a shift-reduce style.
 
         """
+        result = build(line.strip())
+        if result is not None:
+            return result
         # Current state. It denotes the last significant symbol encountered. 1 for (, 2 for :, 3 for /,
         # and 0 for start state or ')'
         # Last significant symbol is ( --- start processing node name
         # Last significant symbol is : --- start processing relation name
         # Last significant symbol is / --- start processing node value (concept name)
         # Last significant symbol is ) --- current node processing is complete
-        # Note that if these symbols are inside parenthesis, they are not significant symbols.
+        # Note that if these symbols are inside quotes, they are not significant symbols.
         state = 0
         # node stack for parsing
         stack = []
         # current not-yet-reduced character sequence
-        cur_charseq = []
+        cur_charseq = ""
         # key: node name value: node value
         node_dict = {}
         # node name list (order: occurrence of the node)
@@ -218,51 +329,43 @@ class AMR(object):
         node_relation_dict2 = defaultdict(list)
         # current relation name
         cur_relation_name = ""
-        # having unmatched quote string
-        in_quote = False
-        for i, c in enumerate(line.strip()):
-            if c == " ":
-                # allow space in relation name
-                if state == 2:
-                    cur_charseq.append(c)
-                continue
-            if c == "\"":
-                # flip in_quote value when a quote symbol is encountered
-                # insert placeholder if in_quote from last symbol
-                if in_quote:
-                    cur_charseq.append('¦')
-                in_quote = not in_quote
-            elif c == "(":
-                # not significant symbol if inside quote
-                if in_quote:
-                    cur_charseq.append(c)
-                    continue
+        tokens = TOKENS.findall(line.strip())
+        for k, (segment, c) in enumerate(tokens):
+            if segment:
+                # not significant symbols, so we just shift.  spaces are only preserved in relation names (and
+                # values), and quote symbols are dropped, inserting a placeholder for each closing quote.
+                if "\"" in segment:
+                    parts = segment.split("\"")
+                    for j in range(1, len(parts) - 1, 2):
+                        parts[j] += "¦"
+                    segment = "".join(parts)
+                if state != 2:
+                    segment = segment.replace(" ", "")
+                cur_charseq += segment
+            if c == "(":
                 # get the attribute name
                 # e.g :arg0 (x ...
                 # at this point we get "arg0"
                 if state == 2:
                     # in this state, current relation name should be empty
                     if cur_relation_name != "":
+                        i = position(tokens, k)
                         print("Format error when processing ", line[0:i + 1], file=ERROR_LOG)
                         return None
                     # update current relation name for future use
-                    cur_relation_name = "".join(cur_charseq).strip()
-                    cur_charseq[:] = []
+                    cur_relation_name = cur_charseq.strip()
+                    cur_charseq = ""
                 state = 1
             elif c == ":":
-                # not significant symbol if inside quote
-                if in_quote:
-                    cur_charseq.append(c)
-                    continue
                 # Last significant symbol is "/". Now we encounter ":"
                 # Example:
                 # :OR (o2 / *OR*
                 #    :mod (o3 / official)
                 #  gets node value "*OR*" at this point
                 if state == 3:
-                    node_value = "".join(cur_charseq)
+                    node_value = cur_charseq
                     # clear current char sequence
-                    cur_charseq[:] = []
+                    cur_charseq = ""
                     # pop node name ("o2" in the above example)
                     cur_node_name = stack[-1]
                     # update node name/value map
@@ -274,10 +377,11 @@ class AMR(object):
                 # the problem is that we cannot decide if node value is attribute value (constant)
                 # or node value (variable) at this moment
                 elif state == 2:
-                    temp_attr_value = "".join(cur_charseq)
-                    cur_charseq[:] = []
+                    temp_attr_value = cur_charseq
+                    cur_charseq = ""
                     parts = temp_attr_value.split()
                     if len(parts) < 2:
+                        i = position(tokens, k)
                         print("Error in processing; part len < 2", line[0:i + 1], file=ERROR_LOG)
                         return None
                     # For the above example, node name is "op1", and node value is "w"
@@ -287,6 +391,7 @@ class AMR(object):
                     # We need to link upper level node to the current
                     # top of stack is upper level node
                     if len(stack) == 0:
+                        i = position(tokens, k)
                         print("Error in processing", line[:i], relation_name, relation_value, file=ERROR_LOG)
                         return None
                     # if we have not seen this node name before
@@ -296,16 +401,13 @@ class AMR(object):
                         node_relation_dict1[stack[-1]].append((relation_name, relation_value))
                 state = 2
             elif c == "/":
-                if in_quote:
-                    cur_charseq.append(c)
-                    continue
                 # Last significant symbol is "(". Now we encounter "/"
                 # Example:
                 # (d / default-01
                 # get "d" here
                 if state == 1:
-                    node_name = "".join(cur_charseq)
-                    cur_charseq[:] = []
+                    node_name = cur_charseq
+                    cur_charseq = ""
                     # if this node name is already in node_dict, it is duplicate
                     if node_name in node_dict:
                         print("Duplicate node name ", node_name, " in parsing AMR", file=ERROR_LOG)
@@ -321,29 +423,20 @@ class AMR(object):
                     # node name is n
                     # we have a relation arg1(upper level node, n)
                     if cur_relation_name != "":
-                        # if relation name ends with "-of", e.g."arg0-of",
-                        # it is reverse of some relation. For example, if a is "arg0-of" b,
-                        # we can also say b is "arg0" a.
-                        # If the relation name ends with "-of", we store the reverse relation.
-                        if True or not cur_relation_name.endswith("-of"):
-                            # stack[-2] is upper_level node we encountered, as we just add node_name to stack
-                            node_relation_dict1[stack[-2]].append((cur_relation_name, node_name))
-                        else:
-                            # cur_relation_name[:-3] is to delete "-of"
-                            node_relation_dict1[node_name].append((cur_relation_name[:-3], stack[-2]))
+                        # stack[-2] is upper_level node we encountered, as we just add node_name to stack
+                        node_relation_dict1[stack[-2]].append((cur_relation_name, node_name))
                         # clear current_relation_name
                         cur_relation_name = ""
                 else:
                     # error if in other state
+                    i = position(tokens, k)
                     print("Error in parsing AMR", line[0:i + 1], file=ERROR_LOG)
                     return None
                 state = 3
             elif c == ")":
-                if in_quote:
-                    cur_charseq.append(c)
-                    continue
                 # stack should be non-empty to find upper level node
                 if len(stack) == 0:
+                    i = position(tokens, k)
                     print("Unmatched parenthesis at position", i, "in processing", line[0:i + 1], file=ERROR_LOG)
                     return None
                 # Last significant symbol is ":". Now we encounter ")"
@@ -351,22 +444,19 @@ class AMR(object):
                 # :op2 "Brown") or :op2 w)
                 # get \"Brown\" or w here
                 if state == 2:
-                    temp_attr_value = "".join(cur_charseq)
-                    cur_charseq[:] = []
+                    temp_attr_value = cur_charseq
+                    cur_charseq = ""
                     parts = temp_attr_value.split()
                     if len(parts) < 2:
+                        i = position(tokens, k)
                         print("Error processing", line[:i + 1], temp_attr_value, file=ERROR_LOG)
                         return None
                     relation_name = parts[0].strip()
                     relation_value = parts[1].strip()
-                    # store reverse of the relation
-                    # we are sure relation_value is a node here, as "-of" relation is only between two nodes
-                    if False and relation_name.endswith("-of"):
-                        node_relation_dict1[relation_value].append((relation_name[:-3], stack[-1]))
                     # attribute value not seen before
                     # Note that it might be a constant attribute value, or an unseen node
                     # process this after we have seen all the node names
-                    elif relation_value not in node_dict:
+                    if relation_value not in node_dict:
                         node_relation_dict2[stack[-1]].append((relation_name, relation_value))
                     else:
                         node_relation_dict1[stack[-1]].append((relation_name, relation_value))
@@ -375,8 +465,8 @@ class AMR(object):
                 # :arg1 (n / nation)
                 # we get "nation" here
                 elif state == 3:
-                    node_value = "".join(cur_charseq)
-                    cur_charseq[:] = []
+                    node_value = cur_charseq
+                    cur_charseq = ""
                     cur_node_name = stack[-1]
                     # map node name to its value
                     node_dict[cur_node_name] = node_value
@@ -384,9 +474,6 @@ class AMR(object):
                 stack.pop()
                 cur_relation_name = ""
                 state = 0
-            else:
-                # not significant symbols, so we just shift.
-                cur_charseq.append(c)
         #create data structures to initialize an AMR
         node_value_list = []
         relation_list = []
@@ -15,6 +15,7 @@ try:
     import smatch.amr
 except:
     import amr
+import math
 import os
 import random
 import sys
@@ -46,6 +47,20 @@ DEBUG_LOG = sys.stderr
 # value: the matching triple count
 match_triple_dict = {}
 
+# number of restarts skipped in the most recent call to get_best_match(), because
+# the trivial upper bound on the triple match number had already been reached
+saved_iteration_num = 0
+
+# seed of the random number generator that each search strategy creates for every pair of AMRs, such that the
+# result for one pair does not depend on the random numbers drawn for others (e.g. on how many restarts they took)
+random_seed = 0
+
+# parameters to the alternative search strategy (see simulated_annealing()): random steps per node in
+# each annealing round, and start and end temperature of the annealing schedule
+annealing_steps = 20
+annealing_temperature = 2.0
+annealing_final = 0.05
+
 
 def build_arg_parser():
     """
@@ -137,6 +152,41 @@ def get_best_match(instance1, attribute1, relation1,
         print("Weight dictionary", file=DEBUG_LOG)
         print(weight_dict, file=DEBUG_LOG)
 
+    # the number of matching triples can never exceed the size of the smaller triple set, hence
+    # once a mapping scores min(|triples1|, |triples2|), further restarts cannot improve on it
+    triple_num1 = triple_num2 = 0
+    if doinstance:
+        triple_num1 += len(instance1)
+        triple_num2 += len(instance2)
+    if doattribute:
+        triple_num1 += len(attribute1)
+        triple_num2 += len(attribute2)
+    if dorelation:
+        triple_num1 += len(relation1)
+        triple_num2 += len(relation2)
+    upper_bound = min(triple_num1, triple_num2)
+    return hill_climb(candidate_mappings, weight_dict, instance1, instance2, upper_bound)
+
+
+def hill_climb(candidate_mappings, weight_dict, instance1, instance2, upper_bound, rng=None):
+    """
+    Random-restart hill-climbing over a pre-computed candidate pool.
+    Arguments:
+        candidate_mappings: candidate node match list, as returned by compute_pool()
+        weight_dict: weight dictionary, as returned by compute_pool()
+        instance1: instance triples of AMR 1
+        instance2: instance triples of AMR 2
+        upper_bound: triple match number at which no further restarts are attempted
+        rng: random number generator (by default, a new one, seeded with random_seed)
+    Returns:
+        best_match: the node mapping that results in the highest triple matching number
+        best_match_num: the highest triple matching number
+
+    """
+    global saved_iteration_num
+    saved_iteration_num = 0
+    if rng is None:
+        rng = random.Random(random_seed)
     best_match_num = 0
     # initialize best match mapping
     # the ith entry is the node index in AMR 2 which maps to the ith node in AMR 1
@@ -146,10 +196,10 @@ def get_best_match(instance1, attribute1, relation1,
             print("Iteration", i, file=DEBUG_LOG)
         if i == 0:
             # smart initialization used for the first round
-            cur_mapping = smart_init_mapping(candidate_mappings, instance1, instance2)
+            cur_mapping = smart_init_mapping(candidate_mappings, instance1, instance2, rng)
         else:
             # random initialization for the other round
-            cur_mapping = random_init_mapping(candidate_mappings)
+            cur_mapping = random_init_mapping(candidate_mappings, rng)
         # compute current triple match number
         match_num = compute_match(cur_mapping, weight_dict)
         if veryVerbose:
@@ -173,6 +223,13 @@ def get_best_match(instance1, attribute1, relation1,
         if match_num > best_match_num:
             best_mapping = cur_mapping[:]
             best_match_num = match_num
+        if best_match_num >= upper_bound:
+            # provably optimal: skip all remaining restarts
+            saved_iteration_num = iteration_num - i - 1
+            if verbose and saved_iteration_num:
+                print("Upper bound", upper_bound, "reached; skipping", saved_iteration_num,
+                      "remaining restart(s)", file=DEBUG_LOG)
+            break
     return best_mapping, best_match_num
 
 
@@ -294,18 +351,81 @@ def compute_pool(instance1, attribute1, relation1,
     return candidate_mapping, weight_dict
 
 
-def smart_init_mapping(candidate_mapping, instance1, instance2):
+def compute_id_pool(instance1, attribute1, relation1,
+                    instance2, attribute2, relation2):
+    """
+    compute_pool() for triples over integers: node indices instead of prefixed node names, and interned
+    symbol ids instead of (normalized) relation names and values.  Matching triples are found through hash
+    lookup rather than by comparing all pairs of triples, but the resulting pool is the same.
+
+    Arguments:
+        instance1: instance triples of AMR 1 (instance symbol, node index, concept symbol), in node order
+        attribute1: attribute triples of AMR 1 (attribute symbol, node index, value symbol)
+        relation1: relation triples of AMR 1 (relation symbol, node 1 index, node 2 index)
+        instance2: instance triples of AMR 2
+        attribute2: attribute triples of AMR 2
+        relation2: relation triples of AMR 2
+    Returns:
+      candidate_mapping: a list of candidate nodes, as in compute_pool()
+      weight_dict: the weight dictionary, as in compute_pool()
+
+    """
+    candidate_mapping = [set() for _ in instance1]
+    weight_dict = {}
+
+    def index(triples):
+        result = {}
+        for name, node, value in triples:
+            result.setdefault((name, value), []).append(node)
+        return result
+
+    for triples1, triples2 in (instance1, instance2), (attribute1, attribute2):
+        nodes2 = index(triples2)
+        for name, node1_index, value in triples1:
+            for node2_index in nodes2.get((name, value), ()):
+                candidate_mapping[node1_index].add(node2_index)
+                node_pair = (node1_index, node2_index)
+                if node_pair in weight_dict:
+                    weight_dict[node_pair][-1] += 1
+                else:
+                    weight_dict[node_pair] = {-1: 1}
+    edges2 = {}
+    for name, source, target in relation2:
+        edges2.setdefault(name, []).append((source, target))
+    for name, node1_index_amr1, node2_index_amr1 in relation1:
+        for node1_index_amr2, node2_index_amr2 in edges2.get(name, ()):
+            candidate_mapping[node1_index_amr1].add(node1_index_amr2)
+            candidate_mapping[node2_index_amr1].add(node2_index_amr2)
+            node_pair1 = (node1_index_amr1, node1_index_amr2)
+            node_pair2 = (node2_index_amr1, node2_index_amr2)
+            if node_pair2 != node_pair1:
+                if node1_index_amr1 > node2_index_amr1:
+                    node_pair1, node_pair2 = node_pair2, node_pair1
+                weights = weight_dict.setdefault(node_pair1, {-1: 0})
+                weights[node_pair2] = weights.get(node_pair2, 0) + 1
+                weights = weight_dict.setdefault(node_pair2, {-1: 0})
+                weights[node_pair1] = weights.get(node_pair1, 0) + 1
+            else:
+                weights = weight_dict.setdefault(node_pair1, {-1: 0})
+                weights[-1] += 1
+    return candidate_mapping, weight_dict
+
+
+def smart_init_mapping(candidate_mapping, instance1, instance2, rng=None):
     """
     Initialize mapping based on the concept mapping (smart initialization)
     Arguments:
         candidate_mapping: candidate node match list
         instance1: instance triples of AMR 1
         instance2: instance triples of AMR 2
+        rng: random number generator (by default, the freshly re-seeded global one)
     Returns:
         initialized node mapping between two AMRs
 
     """
-    random.seed()
+    if rng is None:
+        random.seed()
+        rng = random
     matched_dict = {}
     result = []
     # list to store node indices that have no concept match
@@ -334,7 +454,7 @@ def smart_init_mapping(candidate_mapping, instance1, instance2):
         candidates = list(candidate_mapping[i])
         while candidates:
             # get a random node index from candidates
-            rid = random.randint(0, len(candidates) - 1)
+            rid = rng.randint(0, len(candidates) - 1)
             candidate = candidates[rid]
             if candidate in matched_dict:
                 candidates.pop(rid)
@@ -345,17 +465,19 @@ def smart_init_mapping(candidate_mapping, instance1, instance2):
     return result
 
 
-def random_init_mapping(candidate_mapping):
+def random_init_mapping(candidate_mapping, rng=None):
     """
     Generate a random node mapping.
     Args:
         candidate_mapping: candidate_mapping: candidate node match list
+        rng: random number generator (by default, the freshly re-seeded global one)
     Returns:
         randomly-generated node mapping between two AMRs
 
     """
-    # if needed, a fixed seed could be passed here to generate same random (to help debugging)
-    random.seed()
+    if rng is None:
+        random.seed()
+        rng = random
     matched_dict = {}
     result = []
     for c in candidate_mapping:
@@ -367,7 +489,7 @@ def random_init_mapping(candidate_mapping):
         found = False
         while candidates:
             # randomly generate an index in [0, length of candidates)
-            rid = random.randint(0, len(candidates) - 1)
+            rid = rng.randint(0, len(candidates) - 1)
             candidate = candidates[rid]
             # check if it has already been matched
             if candidate in matched_dict:
@@ -647,6 +769,83 @@ def get_best_gain(mapping, candidate_mappings, weight_dict, instance_len, cur_ma
     return largest_gain, cur_mapping
 
 
+def initial_mapping(i, candidate_mappings, instance1, instance2, rng):
+    """
+    Starting point for round i of a search: smart initialization first, random initialization afterwards
+
+    """
+    if i == 0:
+        return smart_init_mapping(candidate_mappings, instance1, instance2, rng)
+    return random_init_mapping(candidate_mappings, rng)
+
+
+def simulated_annealing(candidate_mappings, weight_dict, instance1, instance2, upper_bound, rng=None):
+    """
+    Simulated annealing over the candidate pool, as an alternative to hill_climb().  Each of iteration_num
+    rounds performs annealing_steps random move or swap steps per node in AMR 1, where steps that lower the
+    triple match number are accepted with a probability that decreases as the temperature is lowered
+    geometrically from annealing_temperature to annealing_final.
+    Arguments and return values are as for hill_climb()
+
+    """
+    global saved_iteration_num
+    saved_iteration_num = 0
+    if rng is None:
+        rng = random.Random(random_seed)
+    best_match_num = 0
+    best_mapping = [-1] * len(instance1)
+    candidates = [list(c) for c in candidate_mappings]
+    nodes = [i for i, c in enumerate(candidates) if c]
+    steps = annealing_steps * len(instance1)
+    cooling = (annealing_final / annealing_temperature) ** (1.0 / steps) if steps else 1.0
+    for i in range(iteration_num):
+        cur_mapping = initial_mapping(i, candidate_mappings, instance1, instance2, rng)
+        match_num = compute_match(cur_mapping, weight_dict)
+        if match_num > best_match_num:
+            best_mapping = cur_mapping[:]
+            best_match_num = match_num
+        # node in AMR 1 currently mapped to each node in AMR 2
+        owner = {m: j for j, m in enumerate(cur_mapping) if m != -1}
+        temperature = annealing_temperature
+        for _ in range(steps if nodes else 0):
+            if best_match_num >= upper_bound:
+                break
+            node1 = rng.choice(nodes)
+            old_id = cur_mapping[node1]
+            new_id = rng.choice(candidates[node1])
+            temperature *= cooling
+            if new_id == old_id:
+                continue
+            node2 = owner.get(new_id)
+            if node2 is None:
+                gain = move_gain(cur_mapping, node1, old_id, new_id, weight_dict, match_num)
+            else:
+                gain = swap_gain(cur_mapping, node1, old_id, node2, new_id, weight_dict, match_num)
+            if gain >= 0 or rng.random() < math.exp(gain / temperature):
+                cur_mapping[node1] = new_id
+                owner[new_id] = node1
+                if node2 is None:
+                    owner.pop(old_id, None)
+                else:
+                    cur_mapping[node2] = old_id
+                    if old_id != -1:
+                        owner[old_id] = node2
+                match_num += gain
+                if match_num > best_match_num:
+                    best_mapping = cur_mapping[:]
+                    best_match_num = match_num
+        if veryVerbose:
+            print("Annealing round", i, "best triple match number:", best_match_num, file=DEBUG_LOG)
+        if best_match_num >= upper_bound:
+            saved_iteration_num = iteration_num - i - 1
+            break
+    return best_mapping, best_match_num
+
+
+# search strategies over a candidate pool, all sharing the signature of hill_climb()
+search_strategies = {"rrhc": hill_climb, "annealing": simulated_annealing}
+
+
 def print_alignment(mapping, instance1, instance2):
     """
     print the alignment based on a node mapping
@@ -797,6 +996,32 @@ def get_amr_match(cur_amr1, cur_amr2, sent_num=1, justinstance=False, justattrib
         return best_match_num, test_triple_num, gold_triple_num, best_mapping
 
 
+def get_id_match(instance1, attribute1, relation1,
+                 instance2, attribute2, relation2, limit=None, search=None):
+    """
+    Integer-native counterpart to get_amr_match(), bypassing string node names and their parsing.
+    Arguments:
+        instance1, attribute1, relation1: triples of AMR 1 over integers (see compute_id_pool())
+        instance2, attribute2, relation2: triples of AMR 2 over integers
+        limit: number of restarts (if given, overrides iteration_num)
+        search: key into search_strategies (default: "rrhc", i.e. hill_climb())
+    Returns:
+        best_match_num, test_triple_num, gold_triple_num, best_mapping
+
+    """
+    global iteration_num
+    if limit is not None: iteration_num = limit
+    (candidate_mappings, weight_dict) = compute_id_pool(instance1, attribute1, relation1,
+                                                        instance2, attribute2, relation2)
+    test_triple_num = len(instance1) + len(attribute1) + len(relation1)
+    gold_triple_num = len(instance2) + len(attribute2) + len(relation2)
+    strategy = search_strategies[search or "rrhc"]
+    (best_mapping, best_match_num) = strategy(candidate_mappings, weight_dict, instance1, instance2,
+                                              min(test_triple_num, gold_triple_num))
+    match_triple_dict.clear()
+    return best_match_num, test_triple_num, gold_triple_num, best_mapping
+
+
 def score_amr_pairs(f1, f2, justinstance=False, justattribute=False, justrelation=False):
     """
     Score one pair of AMR lines at a time from each file handle
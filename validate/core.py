@@ -65,7 +65,7 @@ def test(graph, actions, stream = sys.stderr):
     # to make sure all source and target identifiers actually exist.  maybe
     # add a type check (int), though?
     #
-    nodes = {node.id: node for node in graph.nodes};
+    nodes = graph.compact().index;
     for edge in graph.edges:
       if not isinstance(edge.src, int) or edge.src not in nodes:
         n += 1;